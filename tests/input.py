@@ -1,5 +1,6 @@
 import zgoubidoo
-from zgoubidoo.commands import Quadrupole
+from zgoubidoo.commands import Objet2, Proton, Quadrupole, Sextupole
+from zgoubidoo.commands.beam import BeamZgoubiDistribution
 
 _ = zgoubidoo.ureg
 
@@ -21,3 +22,27 @@ zi += qf
 zi += qd
 
 zi.line
+
+# 'ALL_LINE' mappings skip the commands for which the parameter has a different dimension (dimensionless XPAS)
+zi_mixed = zgoubidoo.Input(name='TEST-ALL-LINE', line=[
+    Objet2(),
+    Proton(),
+    Quadrupole('Q1', XPAS=1 * _.cm),
+    Sextupole('S1'),
+])
+zi_mixed(mappings=[{'ALL_LINE.XPAS': 2 * _.cm}])
+with open(f"{zi_mixed.paths[0][1].name}/zgoubi.dat") as f:
+    deck = f.read()
+assert zi_mixed.Q1.XPAS == 1 * _.cm
+assert zi_mixed.Q1.render_with({'XPAS': 2 * _.cm}) in deck
+assert str(zi_mixed.S1) in deck
+
+# The beam follows the direct modifications of the input sequence
+beam = BeamZgoubiDistribution(kinematics=230 * _.MeV)
+zi_beam = zgoubidoo.Input(name='TEST-BEAM', line=[beam, Quadrupole()])
+assert zi_beam.beam is beam
+new_beam = BeamZgoubiDistribution(kinematics=230 * _.MeV)
+zi_beam.line[0] = new_beam
+assert zi_beam.beam is new_beam
+zi_beam.line[0] = Objet2()
+assert zi_beam.beam is None
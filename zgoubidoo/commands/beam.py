@@ -142,6 +142,9 @@ class BeamZgoubiDistribution(Beam):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
+    _cache_serialization: bool = False
+    """The random seeds of the Monte Carlo object are drawn anew each time the beam is serialized."""
+
     def post_init(self,
                   objet_type: _ObjetType = _MCObjet3,
                   slices: int = 1,
@@ -4,9 +4,11 @@ Commands controlling Zgoubi's control flow, geometry, tracking options, etc.
 TODO
 """
 from __future__ import annotations
-from typing import Any, Tuple, Dict, Mapping, List, Union, Iterable
+from typing import Any, Optional, Tuple, Dict, Mapping, List, Union, Iterable, Iterator, TextIO
 import inspect
-import uuid
+import itertools
+import secrets
+import string as _string
 import numpy as _np
 import pandas as _pd
 import parse as _parse
@@ -22,6 +24,50 @@ import zgoubidoo
 ZGOUBI_LABEL_LENGTH: int = 10
 """Maximum length for the Zgoubi command labels. Used to be 8 on older versions."""
 
+_LABEL_COUNTER = itertools.count()
+"""Counter used to generate unique suffixes for the prefixed labels of the commands."""
+
+
+def _label_ids() -> Iterator[str]:
+    """Generate unique labels for the commands.
+
+    The labels are made of a random prefix followed by a counter (e.g. '3fa2c1002a'). The random prefix is drawn once
+    per process (and again whenever the counter is exhausted), so that the labels generated in different sessions (e.g.
+    for an input loaded with `Input.parse`) do not collide.
+
+    Returns:
+        an iterator over the unique labels.
+    """
+    while True:
+        prefix = secrets.token_hex(3)
+        width = ZGOUBI_LABEL_LENGTH - len(prefix)
+        for n in range(16 ** width):
+            yield f"{prefix}{n:0{width}x}"
+
+
+_LABEL_IDS = _label_ids()
+"""Unique labels for the commands (see `_label_ids`)."""
+
+_LENGTH_DIMENSIONALITY = _ureg.cm.dimensionality
+"""Dimensionality of a length (cached to avoid building it repeatedly when serializing commands)."""
+
+_ANGLE_DIMENSIONALITY = _ureg.radian.dimensionality
+"""Dimensionality of an angle (cached to avoid building it repeatedly when serializing commands)."""
+
+_FORMAT_CONVERSIONS = {
+    'm': _m,
+    'cm': _cm,
+    'radian': _radian,
+    'degree': _degree,
+}
+"""Unit conversions available for the parameters in the `_FORMAT` templates of the commands (e.g. `{XL_cm}`)."""
+
+_TRANSFORMATION_AXES = {'X': 0, 'Y': 1, 'Z': 2}
+"""Indices of the axes of the `ChangRef` transformations."""
+
+_YMY_ROTATION = _np.quaternion(0, 1, 0, 0)
+"""Quaternion of the 180 degree rotation around the X axis performed by `Ymy`."""
+
 
 class ZgoubidooException(Exception):
     """Exception raised for errors in the Zgoubidoo commands module."""
@@ -47,6 +93,27 @@ class Comment:
     def __repr__(self):
         return str(self)
 
+    def serialize(self) -> str:
+        """
+        Provides the string representation of the comment in the Zgoubi input file format.
+
+        Returns:
+            The string representation.
+        """
+        return str(self)
+
+    def write(self, buf: TextIO) -> int:
+        """
+        Write the comment to a text stream.
+
+        Args:
+            buf: the text stream (e.g. an opened file or an `io.StringIO`)
+
+        Returns:
+            the number of characters written.
+        """
+        return buf.write(str(self))
+
 
 class CommandType(type):
     """
@@ -101,23 +168,62 @@ class CommandType(type):
         except IndexError:
             pass
 
+        # Generate a specialized string representation from the format template
+        if '_FORMAT' in dct:
+            dct['__str__'] = mcs._generate_str(dct['_FORMAT'], bases[0])
+
         return super().__new__(mcs, name, bases, dct)
 
+    @staticmethod
+    def _generate_str(template: str, base: type):
+        """
+        Generate the `__str__` method of a command from its format template.
+
+        The template is parsed once, at class creation. The `{COMMAND}` placeholder is replaced by the representation
+        of the base command (keyword and labels); all other placeholders are parameter names, optionally suffixed with
+        one of the units of `_FORMAT_CONVERSIONS` (e.g. `{XL_cm}`), in which case the value is converted to that unit.
+
+        Args:
+            template: the format template of the command
+            base: the base class providing the representation of the `{COMMAND}` placeholder
+
+        Returns:
+            the `__str__` method.
+        """
+        fields = []
+        for _, field, _, _ in _string.Formatter().parse(template):
+            if field is None or field == 'COMMAND':
+                continue
+            parameter, _, units = field.rpartition('_')
+            if parameter and units in _FORMAT_CONVERSIONS:
+                fields.append((field, parameter, _FORMAT_CONVERSIONS[units]))
+            else:
+                fields.append((field, field, None))
+        base_str = base.__str__
+
+        def __str__(self) -> str:
+            attributes = self._resolved_attributes
+            return template.format(
+                COMMAND=base_str(self).rstrip(),
+                **{f: attributes[p] if c is None else c(attributes[p]) for f, p, c in fields}
+            )
+        return __str__
+
     def __init__(cls, name: str, bases: Tuple[type, ...], dct: Dict[str, Any]):
         super().__init__(name, bases, dct)
         if cls.__doc__ is not None:
-            cls.__doc__ = cls.__doc__.rstrip()
-            cls.__doc__ += """
+            cls.__doc__ = ''.join([
+                cls.__doc__.rstrip(),
+                """
             
     .. rubric:: Command attributes
     
     Attributes:
-            """
-            for k, v in cls.PARAMETERS.items():
-                if isinstance(v, tuple) and len(v) >= 2:
-                    cls.__doc__ += f"""
+            """,
+                *(f"""
         {k}='{v[0]}' ({type(v[0]).__name__}): {v[1]}
-            """
+            """ for k, v in cls.PARAMETERS.items() if isinstance(v, tuple) and len(v) >= 2)
+            ])
 
     def __getattr__(cls, key: str):
         try:
@@ -154,6 +260,16 @@ class Command(metaclass=CommandType):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
+    _version: int = 0
+    """Version of the command, incremented each time one of its attributes is set."""
+
+    _serialized: Optional[Tuple[int, str]] = None
+    """Serialization of the command, cached along with the version of the command it was built from."""
+
+    _cache_serialization: bool = True
+    """Whether the serialization of the command can be cached (False for commands drawing random values, e.g. seeds,
+    each time they are serialized)."""
+
     class CommandResult:
         """TODO"""
         def __init__(self, success: bool, results: _pd.DataFrame):
@@ -181,37 +297,40 @@ class Command(metaclass=CommandType):
         """
         self._output: List[Tuple[Mapping[str, Union[_Q, float]], List[str]]] = list()
         self._results: List[Tuple[Mapping[str, Union[_Q, float]], Command.CommandResult]] = list()
-        self._attributes = {}
-        for d in (Command.PARAMETERS, ) + params:
-            self._attributes = dict(self._attributes, **{k: v[0] for k, v in d.items()})
+        self._attributes = {k: v[0] for d in (Command.PARAMETERS, *params) for k, v in d.items()}
+        self._resolved_attributes = {k: Command._resolve(v) for k, v in self._attributes.items()}
+        post_init_parameters = self._POST_INIT
         for k, v in kwargs.items():
-            if k not in self._POST_INIT:
+            if k not in post_init_parameters:
                 setattr(self, k, v)
         if label1:
             if len(label1) > ZGOUBI_LABEL_LENGTH:
                 raise ZgoubidooException(f"LABEL1 '{label1}' for element {self.KEYWORD} is too long.")
-            self._attributes['LABEL1'] = label1
+            self._store_attribute('LABEL1', label1)
         if label2:
             if len(label2) > ZGOUBI_LABEL_LENGTH:
                 raise ZgoubidooException(f"LABEL2 '{label2}' for element {label1} ({self.KEYWORD}) is too long.")
-            self._attributes['LABEL2'] = label2
+            self._store_attribute('LABEL2', label2)
         if not self._attributes['LABEL1']:
             self.generate_label()
         Command.post_init(self, **kwargs)
 
     def generate_label(self, prefix: str = ''):
         """
+        Generate a unique label for the command; the prefix is truncated if needed so that the unique suffix is kept.
 
         Args:
-            prefix:
+            prefix: an optional prefix for the label
 
         Returns:
-
+            the command itself (allows method chaining).
         """
-        self._attributes['LABEL1'] = '_'.join(filter(None, [
-            prefix,
-            str(uuid.uuid4().hex)
-        ]))[:ZGOUBI_LABEL_LENGTH]
+        if prefix:
+            suffix = f"_{next(_LABEL_COUNTER):x}"
+            label = prefix[:ZGOUBI_LABEL_LENGTH - len(suffix)] + suffix
+        else:
+            label = next(_LABEL_IDS)
+        self._store_attribute('LABEL1', label)
         return self
 
     def post_init(self, **kwargs):  # -> NoReturn:
@@ -232,23 +351,54 @@ class Command(metaclass=CommandType):
         Returns:
 
         """
-        if self._attributes.get(a) is None:
+        attr = self._resolved_attributes.get(a)
+        if attr is None:
             try:
                 return super().__getattribute__(a)
             except AttributeError:
                 return None
-        attr = self._attributes[a]
-        if not isinstance(attr, str) and not isinstance(attr, _Q):
-            try:
-                _ = _Q(attr)
-                if _.dimensionless:
-                    return _.magnitude
-                else:
-                    return _
-            except (TypeError, ValueError, _UndefinedUnitError):
-                return attr
+        return attr
+
+    @staticmethod
+    def _resolve(value: Any) -> Any:
+        """Resolve the value of a parameter as it is provided when the parameter is accessed.
+
+        Values other than strings and quantities are converted to quantities when possible, dimensionless quantities
+        being provided as plain magnitudes.
+
+        Args:
+            value: the value of the parameter
+
+        Returns:
+            the resolved value.
+        """
+        if isinstance(value, (str, _Q)):
+            return value
+        try:
+            _ = _Q(value)
+        except (TypeError, ValueError, _UndefinedUnitError):
+            return value
+        if _.dimensionless:
+            return _.magnitude
         else:
-            return attr
+            return _
+
+    def _store_attribute(self, k: str, v: Any):
+        """Store the value of a parameter, along with its resolved value (see `_resolve`).
+
+        The command is marked as modified (see `_modified`).
+
+        Args:
+            k: the name of the parameter
+            v: the value of the parameter
+        """
+        self._attributes[k] = v
+        self._resolved_attributes[k] = Command._resolve(v)
+        self._modified()
+
+    def _modified(self):
+        """Mark the command as modified by incrementing its version, which invalidates its cached serialization."""
+        self.__dict__['_version'] = self._version + 1
 
     def __setattr__(self, k: str, v: Any):
         """
@@ -275,6 +425,7 @@ class Command(metaclass=CommandType):
         """
         if k.startswith('_') or not k.isupper():
             super().__setattr__(k, v)
+            self._modified()
         else:
             k_ = k.rstrip('_')
             if k_ not in self._attributes.keys():
@@ -300,7 +451,7 @@ class Command(metaclass=CommandType):
                                              )
             except (ValueError, TypeError, _UndefinedUnitError):
                 pass
-            self._attributes[k_] = v
+            self._store_attribute(k_, v)
 
     def _retrieve_default_parameter_value(self, k: str) -> Any:
         """
@@ -335,11 +486,71 @@ class Command(metaclass=CommandType):
         '{self.KEYWORD}' {self.LABEL1} {self.LABEL2}
         """
 
+    def serialize(self) -> str:
+        """
+        Provides the string representation of the command in the Zgoubi input file format, cached until the command
+        is modified. Any attribute assignment is tracked (see `_modified`), in-place modifications of mutable attribute
+        values are not. Commands for which `_cache_serialization` is False are serialized anew each time.
+
+        Returns:
+            The string representation.
+        """
+        if not self._cache_serialization:
+            return str(self)
+        if self._serialized is None or self._serialized[0] != self._version:
+            self.__dict__['_serialized'] = (self._version, str(self))
+        return self._serialized[1]
+
+    def render_with(self, overrides: Mapping[str, Any]) -> str:
+        """
+        Provides the string representation of the command in the Zgoubi input file format with some of its parameters
+        overridden, without modifying the command itself.
+
+        Args:
+            overrides: the parameters to override and their values (the values are set as for an assignment, unit
+            inference and dimension checks included)
+
+        Returns:
+            The string representation.
+        """
+        if not overrides:
+            return self.serialize()
+        clone = self._clone()
+        for k, v in overrides.items():
+            setattr(clone, k, v)
+        return str(clone)
+
+    def _clone(self) -> Command:
+        """
+        Lightweight copy of the command (same label), whose parameters can be set without modifying the command itself.
+
+        Returns:
+            the copy of the command.
+        """
+        clone = object.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.__dict__['_attributes'] = dict(self._attributes)
+        clone.__dict__['_resolved_attributes'] = dict(self._resolved_attributes)
+        return clone
+
+    def write(self, buf: TextIO) -> int:
+        """
+        Write the representation of the command in the Zgoubi input file format to a text stream. This allows to
+        serialize a complete input in a single shared buffer.
+
+        Args:
+            buf: the text stream (e.g. an opened file or an `io.StringIO`)
+
+        Returns:
+            the number of characters written.
+        """
+        return buf.write(self.serialize())
+
     def __copy__(self):
         """Object (instance) copy operation."""
         label1 = f"{self.LABEL1}_COPY"
         if len(label1) > ZGOUBI_LABEL_LENGTH:
-            label1 = str(uuid.uuid4().hex)[:ZGOUBI_LABEL_LENGTH]
+            label1 = next(_LABEL_IDS)
         return self.__class__(label1=label1, label2=self.LABEL2, **self.attributes)
 
     def __deepcopy__(self, *args):
@@ -604,12 +815,12 @@ class Chambre(Command):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
-    def __str__(self):
-        return f"""
-        {super().__str__().rstrip()}
-        {self.IA}
-        {self.IFORM}.{self.J} {_cm(self.C1)} {_cm(self.C2)} {_cm(self.C3)} {_cm(self.C4)}
+    _FORMAT = """
+        {COMMAND}
+        {IA}
+        {IFORM}.{J} {C1_cm} {C2_cm} {C3_cm} {C4_cm}
         """
+    """Format template of the command used for the Zgoubi input data."""
 
 
 # Aliases
@@ -642,18 +853,18 @@ class ChangRef(Command, _Patchable):
         c = f"""
         {super().__str__().rstrip()}
         """
-        cc = ""
+        cc = []
         for t in self.TRANSFORMATIONS:
             if t[0] is None or t[1] is None or _np.isclose(t[1].magnitude, 0.0):
                 continue
-            if t[1].dimensionality == _ureg.cm.dimensionality:
-                cc += f"{t[0]} {_cm(t[1])} "
-            elif t[1].dimensionality == _ureg.radian.dimensionality:
-                cc += f"{t[0]} {_degree(t[1])} "
+            if t[1].dimensionality == _LENGTH_DIMENSIONALITY:
+                cc.append(f"{t[0]} {_cm(t[1])} ")
+            elif t[1].dimensionality == _ANGLE_DIMENSIONALITY:
+                cc.append(f"{t[0]} {_degree(t[1])} ")
             else:
                 raise ZgoubidooException(f"Incorrect dimensionality in {self.__class__.__name__}.")
-        if cc != '':
-            return c + cc
+        if cc:
+            return c + ''.join(cc)
         else:
             return ''
 
@@ -674,14 +885,25 @@ class ChangRef(Command, _Patchable):
 
         """
         if self._entry_patched is None:
-            self._entry_patched = _Frame(self.entry)
+            # Translations and rotations act independently on the frame's origin and quaternion: all translations are
+            # summed in a single offset and all rotations are composed (in order) in a single quaternion.
+            offset = _np.zeros(3)
+            rotations = _np.zeros((len(self.TRANSFORMATIONS), 3))
+            n_rotations = 0
             for t in self.TRANSFORMATIONS:
                 if len(t) > 2:
                     raise Exception("Invalid transformation.")
+                axis = _TRANSFORMATION_AXES.get(t[0][0].upper())
+                if axis is None:
+                    raise ZgoubidooException(f"Invalid transformation axis in {self.__class__.__name__}.")
                 if t[0].endswith('S'):
-                    self._entry_patched.translate_axis(t[0][0], t[1])
+                    offset[axis] += _m(t[1])
                 elif t[0].endswith('R'):
-                    self._entry_patched.rotate_axis(t[0][0], t[1])
+                    rotations[n_rotations, axis] = _radian(t[1])
+                    n_rotations += 1
+            self._entry_patched = _Frame(self.entry)._translate(offset)
+            if n_rotations > 0:
+                self._entry_patched._rotate_sequence(rotations[:n_rotations])
         return self._entry_patched
 
 
@@ -713,12 +935,12 @@ class Collimateur(Command):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
-    def __str__(self):
-        return f"""
-        {super().__str__().rstrip()}
-        {self.IA}
-        {self.IFORM}.{self.J} {_cm(self.C1)} {_cm(self.C2)} {_cm(self.C3)} {_cm(self.C4)}
+    _FORMAT = """
+        {COMMAND}
+        {IA}
+        {IFORM}.{J} {C1_cm} {C2_cm} {C3_cm} {C4_cm}
         """
+    """Format template of the command used for the Zgoubi input data."""
 
 
 # Aliases
@@ -813,12 +1035,12 @@ class FaiStore(Command):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
-    def __str__(self):
-        return f"""
-        {super().__str__().rstrip()}
-        {self.FNAME}
-        {self.IP}
+    _FORMAT = """
+        {COMMAND}
+        {FNAME}
+        {IP}
         """
+    """Format template of the command used for the Zgoubi input data."""
 
 
 class Fin(Action):
@@ -1021,11 +1243,10 @@ class Fit(Action, metaclass=FitType):
             self.NP = 1
 
     def __str__(self):
-        command = list()
-        command.append(super().__str__().rstrip())
-        command.append(f"""
-        {len(self.PARAMS) - list(self.PARAMS).count(None)}
-        """)
+        command = [
+            super().__str__().rstrip(),
+            f"\n        {len(self.PARAMS) - list(self.PARAMS).count(None)}",
+        ]
         for p in self.PARAMS:
             if p is None:
                 continue
@@ -1034,23 +1255,17 @@ class Fit(Action, metaclass=FitType):
             else:
                 ip = p['IP']
             if isinstance(p['DV'], (list, tuple)):
-                command.append(f"""
-        {p['IR']} {ip} {p['XC']} [{p['DV'][0]}, {p['DV'][1]}]
-        """)
+                command.append(f"\n        {p['IR']} {ip} {p['XC']} [{p['DV'][0]}, {p['DV'][1]}]")
             else:
-                command.append(f"""
-        {p['IR']} {ip} {p['XC']} {p['DV']}
-        """)
-        command.append(f"""
-        {len(self.CONSTRAINTS) - list(self.PARAMS).count(None)} {self.PENALTY:.12e} {self.ITERATIONS}
-        """)
+                command.append(f"\n        {p['IR']} {ip} {p['XC']} {p['DV']}")
+        command.append(
+            f"\n        {len(self.CONSTRAINTS) - list(self.PARAMS).count(None)} {self.PENALTY:.12e} {self.ITERATIONS}"
+        )
         for c in self.CONSTRAINTS:
             if c is None:
                 continue
-            command.append(f"""
-        {c['IC']} {c['I']} {c['J']} {c['IR']} {c['V']} {c['WV']} {c['NP']}
-        """)
-        return ''.join(map(lambda x: x.rstrip(), command))
+            command.append(f"\n        {c['IC']} {c['I']} {c['J']} {c['IR']} {c['V']} {c['WV']} {c['NP']}")
+        return ''.join(command)
 
     def process_output(self,
                        output: List[str],
@@ -1172,11 +1387,11 @@ class Focale(Command):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
-    def __str__(self):
-        return f"""
-        {super().__str__().rstrip()}
-        {_cm(self.XL)}
+    _FORMAT = """
+        {COMMAND}
+        {XL_cm}
         """
+    """Format template of the command used for the Zgoubi input data."""
 
 
 class FocaleZ(Command):
@@ -1190,11 +1405,11 @@ class FocaleZ(Command):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
-    def __str__(self):
-        return f"""
-        {super().__str__().rstrip()}
-        {_cm(self.XL)}
+    _FORMAT = """
+        {COMMAND}
+        {XL_cm}
         """
+    """Format template of the command used for the Zgoubi input data."""
 
 
 class GasScattering(Command):
@@ -1216,12 +1431,12 @@ class GasScattering(Command):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
-    def __str__(self):
-        return f"""
-        {super().__str__().rstrip()}
-        {self.KGA}
-        {self.AI} {self.DEN}
+    _FORMAT = """
+        {COMMAND}
+        {KGA}
+        {AI} {DEN}
         """
+    """Format template of the command used for the Zgoubi input data."""
 
 
 class GetFitVal(Command):
@@ -1260,11 +1475,11 @@ class GetFitVal(Command):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
-    def __str__(self):
-        return f"""
-        {super().__str__().rstrip()}
-        {self.FNAME}
+    _FORMAT = """
+        {COMMAND}
+        {FNAME}
         """
+    """Format template of the command used for the Zgoubi input data."""
 
 
 class Histo(Command):
@@ -1324,11 +1539,11 @@ class Matrix(Command):
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
-    def __str__(self):
-        return f"""
-        {super().__str__().rstrip()}
-        {self.IORD} {self.IFOC} PRINT
+    _FORMAT = """
+        {COMMAND}
+        {IORD} {IFOC} PRINT
         """
+    """Format template of the command used for the Zgoubi input data."""
 
 
 class MCDesintegration(Command):
@@ -1558,6 +1773,5 @@ class Ymy(Command, _Patchable):
 
         """
         if self._entry_patched is None:
-            self._entry_patched = _Frame(self.entry)
-            self._entry_patched.rotate_x(180 * _ureg.degree)
+            self._entry_patched = _Frame(self.entry) * _YMY_ROTATION
         return self._entry_patched
@@ -111,7 +111,7 @@ class Executable:
         for i, path in enumerate(paths):
             if path[2] is True:
                 continue  # Do not re-execute a path marked as executed
-            _logger.info(f"Calling execute {self.__class__.__name__} for mapping {path[0]} in path {path[1]}")
+            _logger.info("Calling execute %s for mapping %s in path %s", self.__class__.__name__, path[0], path[1])
             future = self._pool.submit(
                 self._execute,
                 path[0],
@@ -191,7 +191,7 @@ class Executable:
                          )
 
         # Run
-        _logger.info(f"Zgoubi process in {path} has started for mapping {mapping}.")
+        _logger.info("Zgoubi process in %s has started for mapping %s.", path, mapping)
         output = proc.communicate()
 
         # Collect STDERR
@@ -210,7 +210,7 @@ class Executable:
                 cputime = float(re.search(r"\d+\.\d+[E|e]?[+|-]?\d+", lines[0]).group())
         if debug:
             print(output[0].decode())
-        _logger.info(f"Zgoubi process in {path} for mapping {mapping} finished in {cputime} s.")
+        _logger.info("Zgoubi process in %s for mapping %s finished in %s s.", path, mapping, cputime)
         return {
             'stdout': output[0].decode().split('\n'),
             'stderr': stderr,
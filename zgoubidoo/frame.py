@@ -624,6 +624,23 @@ class Frame:
         """
         return self * _quaternion.from_rotation_vector(angles)
 
+    def _rotate_sequence(self, rotations: _np.ndarray) -> Frame:
+        """
+        Applies a sequence of rotations, composed in order into a single quaternion before being applied to the frame.
+
+        Examples:
+            >>> f = Frame()._rotate_sequence(_np.array([[0, 0, _np.pi / 2], [_np.pi / 2, 0, 0]]))
+            >>> f.get_quaternion() #doctest: +ELLIPSIS
+            quaternion(0.5..., 0.5..., 0.5..., 0.5...)
+
+        Args:
+            rotations: array of shape (N, 3) with the rotation vectors (radians) of the successive rotations
+
+        Returns:
+            the rotated frame (in place), allows method chaining
+        """
+        return self * _np.multiply.reduce(_quaternion.from_rotation_vector(rotations))
+
     def rotate(self, angles: List[_ureg.Quantity]) -> Frame:
         """
 
@@ -9,18 +9,19 @@ to provide a parametric mapping (combinations of the variations of one or more p
 input files.
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, Optional, Callable, Sequence, Mapping, Union, List, Tuple, Iterable, Any, Deque
+from typing import TYPE_CHECKING, Optional, Callable, Sequence, Mapping, Union, List, Tuple, Iterable, Iterator, Any, Deque, Dict
 from dataclasses import dataclass, field
 from collections import deque
 import itertools
 from inspect import getmembers, isfunction
-from functools import partial, reduce
+from functools import partial, lru_cache
 import tempfile
+import concurrent.futures
 import logging
 import shutil
 import os
+import re as _re
 import pandas as _pd
-import parse as _parse
 from . import ureg as _ureg
 from . import _Q
 from .frame import Frame as _Frame
@@ -56,6 +57,12 @@ PathsListType = List[Tuple[MappedParametersType, Union[str, tempfile.TemporaryDi
 flatten = itertools.chain.from_iterable
 """Helper function to flatten an iterable."""
 
+_FILTER_NAME_TRANSLATION = str.maketrans({',': '_', ' ': None, "'": None, '(': None, ')': None})
+"""Translation table used to build the name of filtered inputs."""
+
+INPUT_WRITERS: int = min(8, os.cpu_count() or 1)
+"""Number of threads used to write the input files when generating the inputs for parametric mappings."""
+
 
 class ZgoubiInputException(Exception):
     """Exception raised for errors within Zgoubi Input."""
@@ -64,6 +71,63 @@ class ZgoubiInputException(Exception):
         self.message = m
 
 
+class _MappingDirectory:
+    """Directory holding the input file of a single mapping.
+
+    The directories of all the mappings generated together are created within a single parent temporary directory.
+    Provides the `name` attribute and the `cleanup` method of a `tempfile.TemporaryDirectory`; the parent directory
+    (and all its content) is removed when it is cleaned up or when all its mapping directories are garbage collected.
+    """
+    __slots__ = ('name', 'parent')
+
+    def __init__(self, parent: tempfile.TemporaryDirectory, name: str):
+        self.parent: tempfile.TemporaryDirectory = parent
+        self.name: str = os.path.join(parent.name, name)
+        os.mkdir(self.name)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name!r}>"
+
+    def cleanup(self):
+        """Remove the directory and its content."""
+        shutil.rmtree(self.name, ignore_errors=True)
+
+
+class _SequenceElement(dict):
+    """Lightweight row of a sequence, as provided to the converters.
+
+    Exposes the columns of the row by key (including `get`) and the index of the row as `name`, as a `pandas.Series`
+    row would, without the cost of building a `Series` for each element of the sequence.
+    """
+    __slots__ = ('name',)
+
+    def __init__(self, name: str, data: Iterable[Tuple[str, Any]]):
+        super().__init__(data)
+        self.name = name
+
+
+@lru_cache(maxsize=None)
+def _parse_mapping_key(key: Union[str, Tuple[str, str]]) -> Optional[Tuple[str, str]]:
+    """Parse the key of a parametric mapping into the label of the command and the name of the parameter.
+
+    The keys are parsed once and cached, as the same keys are used for all the combinations of a mapping.
+
+    Args:
+        key: a string of the form 'LABEL1.PARAMETER' or a tuple ('LABEL1', 'PARAMETER')
+
+    Returns:
+        the label and the parameter, None if the key does not refer to a parameter.
+    """
+    try:
+        _ = key.split('.')
+    except AttributeError:
+        _ = key
+    if len(_) > 1:
+        assert len(_) == 2, "Parametric mapping labels must be a tuple of 2 strings."
+        return _[0], _[1]
+    return None
+
+
 @dataclass
 class ParametricMapping:
     """Abstraction for multi-dimensional parametric mappings.
@@ -111,8 +175,24 @@ class ParametricMapping:
             - https://docs.python.org/3/library/itertools.html#itertools.product
             - https://codereview.stackexchange.com/q/211121/52027
         """
-        pool_values = [flatten(term) for term in itertools.product(*self.pools)]
-        return [dict(zip(self.labels, v)) for v in pool_values] or [{}]
+        return list(self.iter_combinations())
+
+    def iter_combinations(self) -> Iterator[MappedParametersType]:
+        """Iterate lazily over the cartesian product of the mappings (see `combinations`).
+
+        The combinations are generated one at a time, so that large multi-dimensional mappings never need to be
+        held in memory at once.
+
+        Returns:
+            an iterator over the cartesian product of the mappings (a single empty mapping if the product is empty).
+        """
+        labels = self.labels
+        empty = True
+        for term in itertools.product(*self.pools):
+            empty = False
+            yield dict(zip(labels, flatten(term)))
+        if empty:
+            yield {}
 
     def __add__(self, other):
         """TODO might need to be adapted or with iadd also ?"""
@@ -153,9 +233,12 @@ class Input:
         self._name: str = name
         line = line or list()
         self._line: Deque[_Command] = deque(line)
+        assert isinstance(self._line, deque), "The input sequence must be a deque."
         self._paths: PathsListType = list()
         self._optical_length: _Q = 0 * _ureg.m
         self._reference_frame: Optional[_Frame] = None
+        self._labels_index: Dict[str, int] = dict()
+        self._beam_cache: Optional[_Beam] = None
 
     def __del__(self):
         _logger.debug(f"Input object '{self.name }' for paths {self.paths} is being destroyed.")
@@ -176,7 +259,7 @@ class Input:
 
     def __call__(self,
                  *,
-                 mappings: Optional[MappedParametersListType] = None,
+                 mappings: Optional[Union[MappedParametersListType, ParametricMapping]] = None,
                  filename: str = ZGOUBI_INPUT_FILENAME,
                  path: Optional[str] = None) -> Input:
         """
@@ -193,14 +276,15 @@ class Input:
         return self
 
     def _generate(self,
-                  mappings: Optional[MappedParametersListType] = None,
+                  mappings: Optional[Union[MappedParametersListType, ParametricMapping]] = None,
                   filename: str = ZGOUBI_INPUT_FILENAME,
                   path: Optional[str] = None,
                   ) -> PathsListType:
         """Writes the string representation of the object onto files (Zgoubi input files).
 
         Args:
-            mappings: TODO
+            mappings: the mapped parameters, either as a list or as a `ParametricMapping` (the combinations are then
+            generated lazily)
             filename: the Zgoubi input file name (default: zgoubi.dat)
             path: an optional path for the temporary directories that will be created for the input files (default:
             uses temporary paths)
@@ -210,26 +294,50 @@ class Input:
 
         """
         paths: PathsListType = list()
+        if isinstance(mappings, ParametricMapping):
+            mappings = mappings.iter_combinations()
         mappings = mappings or [{}]
-        if len(self.beam_mappings) > 0:
-            mappings = list(map(lambda _: {**_[0], **_[1]}, itertools.product(mappings, self.beam_mappings)))
-        initial_state: MappedParametersType = {}
-        for mapping in mappings:
-            if mapping in self.mappings:  # Prevent duplicate entries but allows existing mappings to be regenerated
-                for i, p in enumerate(self._paths):
-                    if p[0] == mapping:
-                        del self._paths[i]
-            previous_state = self.adjust(mapping)
-            if initial_state is None:
-                initial_state = previous_state
-            if path is not None:
-                path = path.rstrip('/') + '/'
-            target_dir = tempfile.TemporaryDirectory(prefix=path)
-            paths.append((mapping, target_dir, False))
-            Input.write(self, filename, path=target_dir.name)
-        self.adjust(initial_state)
+        beam_mappings = self.beam_mappings
+        if len(beam_mappings) > 0:
+            mappings = ({**m, **b} for m in mappings for b in beam_mappings)
+        if path is not None:
+            path = path.rstrip('/') + '/'
+        # A single temporary directory holds the directories of all the mappings
+        parent_dir = tempfile.TemporaryDirectory(prefix=path)
+        # The input is serialized for each mapping in turn, only the files are written concurrently
+        writes: Deque[concurrent.futures.Future] = deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=INPUT_WRITERS) as executor:
+            for n, mapping in enumerate(mappings):
+                if mapping in self.mappings:  # Prevent duplicate entries but allows existing mappings to be regenerated
+                    for i, p in enumerate(self._paths):
+                        if p[0] == mapping:
+                            del self._paths[i]
+                target_dir = _MappingDirectory(parent_dir, f"m{n:06d}")
+                paths.append((mapping, target_dir, False))
+                if len(writes) >= 2 * INPUT_WRITERS:  # Bounds the number of serialized inputs held in memory
+                    writes.popleft().result()
+                writes.append(executor.submit(Input._write_file,
+                                              ''.join(self.build_iter(self._name, self._line, self.overrides(mapping))),
+                                              os.path.join(target_dir.name, filename),
+                                              ))
+            for w in writes:
+                w.result()
         return paths
 
+    @staticmethod
+    def _write_file(content: str, filename: str) -> int:
+        """Write a serialized input to file.
+
+        Args:
+            content: the serialized input
+            filename: the full path of the file
+
+        Returns:
+            the number of characters written.
+        """
+        with open(filename, 'w') as f:
+            return f.write(content)
+
     def __len__(self) -> int:
         """Length of the input sequence.
 
@@ -248,6 +356,7 @@ class Input:
             the input sequence (in-place operation).
         """
         self._line.append(command)
+        self._beam_cache = None
         return self
 
     def __isub__(self, other: Union[str, _Command]) -> Input:
@@ -260,9 +369,12 @@ class Input:
             the `Input` itself (in-place operation).
         """
         if isinstance(other, str):
-            self._line = [c for c in self._line if c.LABEL1 != other]
-        else:
-            self._line = [c for c in self._line if c != other]
+            if self._label_position(other) is not None:
+                self._line = deque(c for c in self._line if c.LABEL1 != other)
+        elif self._label_position(other.LABEL1) is not None:
+            serialized = other.serialize()
+            self._line = deque(c for c in self._line if c.LABEL1 != other.LABEL1 or c.serialize() != serialized)
+        self._beam_cache = None
         return self
 
     def __getitem__(self,
@@ -320,14 +432,8 @@ class Input:
             if not isinstance(items, (tuple, list)):
                 items = (items,)
             l, i = self._filter(items)
-            items = tuple(map(lambda x: x.__name__ if isinstance(x, type) else x, items))
-            return Input(name=f"{self._name}_filtered_by_{items}"
-                         .replace(',', '_')
-                         .replace(' ', '')
-                         .replace("'", '')
-                         .replace("(", '')
-                         .replace(")", '')
-                         .rstrip('_'),
+            items = tuple(x.__name__ if isinstance(x, type) else x for x in items)
+            return Input(name=f"{self._name}_filtered_by_{items}".translate(_FILTER_NAME_TRANSLATION).rstrip('_'),
                          line=l,
                          )
 
@@ -340,10 +446,33 @@ class Input:
         Returns:
 
         """
-        for e in self._line:
-            if e.LABEL1 == item:
-                return e
-        raise AttributeError(f"Command with LABEL1 = {item} not found in the input sequence.")
+        if item.startswith('_'):
+            raise AttributeError(item)
+        i = self._label_position(item)
+        if i is None:
+            raise AttributeError(f"Command with LABEL1 = {item} not found in the input sequence.")
+        return self._line[i]
+
+    def _label_position(self, label: str) -> Optional[int]:
+        """Position of the first command with a given LABEL1 in the input sequence.
+
+        The positions are looked-up in an index of the labels. The index is built lazily and is rebuilt whenever the
+        position found is not valid anymore (modified sequence or modified labels), so that it is always consistent
+        with the sequence, even when the sequence is modified directly.
+
+        Args:
+            label: the LABEL1 of the command
+
+        Returns:
+            the position of the command in the input sequence, None if it is not present.
+        """
+        i = self._labels_index.get(label)
+        if i is None or i >= len(self._line) or self._line[i].LABEL1 != label:
+            self._labels_index = dict()
+            for j, e in enumerate(self._line):
+                self._labels_index.setdefault(e.LABEL1, j)
+            i = self._labels_index.get(label)
+        return i
 
     def __setattr__(self, key: str, value: Any):  # -> NoReturn
         """
@@ -358,13 +487,17 @@ class Input:
         if key.startswith('_'):
             self.__dict__[key] = value
         else:
+            # The commands for which the parameter is not defined are skipped upfront instead of raising
+            parameter = key.rstrip('_') if key.isupper() else None
             for e in self._line:
+                if parameter is not None and isinstance(e, _Command) and parameter not in e._attributes:
+                    continue
                 try:
                     setattr(e, key, value)
                 except _ZgoubidooException:
                     pass
 
-    def __contains__(self, items: Union[str, CommandType, Tuple[Union[str, CommandType]]]) -> int:
+    def __contains__(self, items: Union[str, CommandType, Tuple[Union[str, CommandType]]]) -> bool:
         """
 
         Args:
@@ -375,8 +508,26 @@ class Input:
         """
         if not isinstance(items, tuple):
             items = (items,)
-        l, i = self._filter(items)
-        return len(l)
+        try:
+            items = Input._command_types(items)
+        except AttributeError:
+            return False
+        return any(isinstance(e, items) for e in self._line)
+
+    @staticmethod
+    def _command_types(items: Tuple[Union[str, CommandType]]) -> Tuple[CommandType]:
+        """Command classes from a tuple of classes or class names.
+
+        Args:
+            items: the classes or the names of the classes
+
+        Returns:
+            the tuple of the command classes.
+
+        Raises:
+            AttributeError if a class name is not a valid command.
+        """
+        return tuple(getattr(zgoubidoo.commands, x.capitalize()) if isinstance(x, str) else x for x in items)
 
     def _filter(self, items: Union[str, CommandType, Tuple[Union[str, CommandType]]]) -> tuple:
         """
@@ -388,12 +539,10 @@ class Input:
 
         """
         try:
-            items = tuple(map(
-                lambda x: getattr(zgoubidoo.commands, x.capitalize()) if isinstance(x, str) else x, items
-            ))
+            items = Input._command_types(items)
         except AttributeError:
             return list(), tuple()
-        return list(filter(lambda x: reduce(lambda u, v: u or v, [isinstance(x, i) for i in items]), self._line)), items
+        return [e for e in self._line if isinstance(e, items)], items
 
     def apply(self, f: Callable[[_Command], _Command]) -> Input:
         """Apply (map) a function on each command of the input sequence.
@@ -406,7 +555,8 @@ class Input:
         Returns:
             the input sequence (in place operation).
         """
-        self._line = list(map(f, self._line))
+        self._line = deque(map(f, self._line))
+        self._beam_cache = None
         return self
 
     def cleanup(self):
@@ -422,11 +572,17 @@ class Input:
             >>> zi(mappings=pm)  # Writes input files in newly created tempoary directories
             >>> zi.cleanup()  # Cleanup the temporary directories and Zgoubi input files
         """
+        parents = dict()
         for p in self._paths:
+            if isinstance(p[1], _MappingDirectory):  # The parent directories are removed at once
+                parents[id(p[1].parent)] = p[1].parent
+                continue
             try:
                 p[1].cleanup()
             except AttributeError:
                 pass
+        for parent in parents.values():
+            parent.cleanup()
         self.apply(lambda _: _.clean_output_and_results())
         self._paths = []
 
@@ -456,8 +612,10 @@ class Input:
         Returns:
 
         """
-        for i, r in parameters.iterrows():
-            setattr(self[r['element_id'] - 1], r['parameter'], r['final'])
+        for element_id, parameter, final in zip(parameters['element_id'].astype(int).to_numpy(),
+                                                parameters['parameter'].to_numpy(),
+                                                parameters['final'].to_numpy()):
+            setattr(self._line[element_id - 1], parameter, final)
         return self
 
     def adjust(self, mapping: MappedParametersType) -> MappedParametersType:
@@ -471,20 +629,54 @@ class Input:
         """
         initial_values = {}
         for k, v in mapping.items():
-            try:
-                _ = k.split('.')
-            except AttributeError:
-                _ = k
-            if len(_) > 1:
-                assert len(_) == 2, "Parametric mapping labels must be a tuple of 2 strings."
-                if _[0] == 'ALL_LINE':
-                    initial_values[k] = None
-                    setattr(self, _[1], v)
-                else:
-                    initial_values[k] = getattr(getattr(self, _[0]), _[1].rstrip('_'))
-                    setattr(getattr(self, _[0]), _[1], v)
+            _ = _parse_mapping_key(k)
+            if _ is None:
+                continue
+            label, parameter = _
+            if label == 'ALL_LINE':
+                initial_values[k] = None
+                setattr(self, parameter, v)
+            else:
+                command = getattr(self, label)
+                initial_values[k] = getattr(command, parameter.rstrip('_'))
+                setattr(command, parameter, v)
         return initial_values
 
+    def overrides(self, mapping: MappedParametersType) -> Dict[int, Dict[str, Any]]:
+        """Parameters of the commands overridden by a mapping.
+
+        This is the non-mutating counterpart of `adjust`: the commands are left untouched and the overridden
+        parameters are provided for each affected command, to be used when serializing the input (see `build_iter`).
+
+        Args:
+            mapping: the mapped parameters (keys are of the form 'LABEL1.PARAMETER', or 'ALL_LINE.PARAMETER' for all
+            the commands for which the value is valid for that parameter)
+
+        Returns:
+            a dictionary of the overridden parameters and their values, indexed by the `id` of the commands.
+        """
+        overrides: Dict[int, Dict[str, Any]] = dict()
+        for k, v in mapping.items():
+            _ = _parse_mapping_key(k)
+            if _ is None:
+                continue
+            label, parameter = _
+            if label == 'ALL_LINE':
+                # As for an assignment on the input (see `__setattr__`), the commands for which the value is not valid
+                # (e.g. a parameter with a different dimension) are skipped
+                name = parameter.rstrip('_')
+                for e in self._line:
+                    if name not in e.PARAMETERS:
+                        continue
+                    try:
+                        setattr(e._clone(), parameter, v)
+                    except _ZgoubidooException:
+                        continue
+                    overrides.setdefault(id(e), dict())[parameter] = v
+            else:
+                overrides.setdefault(id(getattr(self, label)), dict())[parameter] = v
+        return overrides
+
     def index(self, obj: Union[str, _Command]) -> int:
         """Index of an object in the sequence.
 
@@ -502,9 +694,9 @@ class Input:
         if isinstance(obj, _Command):
             return self.line.index(obj)
         elif isinstance(obj, str):
-            for i, e in enumerate(self.line):
-                if e.LABEL1 == obj:
-                    return i
+            i = self._label_position(obj)
+            if i is not None:
+                return i
         raise ValueError(f"Element {obj} not found.")
 
     def zgoubi_index(self, obj: Union[str, _Command]) -> int:
@@ -535,6 +727,7 @@ class Input:
 
         """
         self.line[self.index(element)] = other
+        self._beam_cache = None
         return self
 
     def insert_before(self, element, other) -> Input:
@@ -548,6 +741,7 @@ class Input:
 
         """
         self.line.insert(self.index(element), other)
+        self._beam_cache = None
         return self
 
     def insert_after(self, element, other) -> Input:
@@ -561,6 +755,7 @@ class Input:
 
         """
         self.line.insert(self.index(element)+1, other)
+        self._beam_cache = None
         return self
 
     def remove(self, prefix: str) -> Input:
@@ -572,7 +767,8 @@ class Input:
         Returns:
 
         """
-        self._line = list(filter(lambda _: not (_.LABEL1 == prefix or _.LABEL1.startswith(prefix + '_')), self.line))
+        self._line = deque(filter(lambda _: not (_.LABEL1 == prefix or _.LABEL1.startswith(prefix + '_')), self._line))
+        self._beam_cache = None
         return self
 
     def get_attributes(self, attribute: str = "LABEL1") -> List[str]:
@@ -586,7 +782,18 @@ class Input:
         Returns:
             the list of the values of the given attribute across the input sequence.
         """
-        return [getattr(e, attribute, None) for e in self._line]
+        # For the commands for which the attribute is a parameter (and not a class attribute or a property), the value
+        # is read directly instead of going through the failed attribute lookup preceding `Command.__getattr__`
+        direct: Dict[type, bool] = dict()
+        values = []
+        for e in self._line:
+            t = type(e)
+            d = direct.get(t)
+            if d is None:
+                d = direct[t] = issubclass(t, _Command) and not any(attribute in vars(k) for k in t.__mro__)
+            v = e._resolved_attributes.get(attribute) if d else None
+            values.append(getattr(e, attribute, None) if v is None else v)
+        return values
 
     labels = property(get_attributes)
     """List of the LABEL1 property of each element of the input sequence."""
@@ -659,19 +866,27 @@ class Input:
 
     @property
     def beam(self) -> Optional[_Beam]:
-        """
+        """The beam of the input sequence.
+
+        The beam is looked up once and cached; the cache is invalidated by the methods modifying the input sequence, and
+        the cached beam is checked to still be part of the sequence on each access (the sequence can be modified
+        directly, for example by replacing an element of `line`). The sequence is looked up again when there is no
+        beam.
 
         Returns:
+            the beam command of the input sequence, None if there is no beam.
 
         Raises:
-            TODO
-
+            ZgoubiInputException if multiple beams are present in the input sequence.
         """
+        cached = self._beam_cache
+        if cached is not None and any(c is cached for c in self._line):
+            return cached
         _ = self['BEAM']
         if len(_) > 1:
             raise ZgoubiInputException("Multiple beams found in input.")
-        else:
-            return next(iter(_), None)
+        self._beam_cache = next(iter(_), None)
+        return self._beam_cache
 
     @property
     def beam_mappings(self) -> MappedParametersListType:
@@ -786,21 +1001,20 @@ class Input:
         files = what or [
             ZGOUBI_INPUT_FILENAME,
         ]
-        for m, p, e in self.paths:
-            if e is not executed_only:
-                continue
-            mapping_string = ''
-            for k, v in m.items():
-                if len(mapping_string) != 0:
-                    mapping_string += '__'
-                mapping_string += f"{k}_{v}"
-            mapped_destination = os.path.join(destination, mapping_string)
-            if m != {}:
-                os.mkdir(mapped_destination)
-            for f in files:
-                shutil.copyfile(os.path.join(p.name, f),
-                                os.path.join(mapped_destination, f)
-                                )
+        with concurrent.futures.ThreadPoolExecutor(max_workers=INPUT_WRITERS) as executor:
+            copies = []
+            for m, p, e in self.paths:
+                if e is not executed_only:
+                    continue
+                mapped_destination = os.path.join(destination, '__'.join(f"{k}_{v}" for k, v in m.items()))
+                if m != {}:
+                    os.mkdir(mapped_destination)
+                copies.extend(executor.submit(shutil.copyfile,
+                                              os.path.join(p.name, f),
+                                              os.path.join(mapped_destination, f)
+                                              ) for f in files)
+            for c in copies:
+                c.result()
 
     @classmethod
     def from_sequence(cls,
@@ -827,15 +1041,18 @@ class Input:
         conversion_functions = {**madx_converters, **(converters or {})}
         elements_database = elements_database or {}
         options = options or {}
-        converted_sequence = deque(
-            sequence.apply(
-                lambda _: elements_database.get(_.name,
-                                                conversion_functions.get(_['KEYWORD'], lambda _, __, ___: None)
-                                                (_, sequence.kinematics, options.get(_['KEYWORD'], {}))
-                                                ),
-                axis=1
-            ).values
-        )
+        df = sequence.df
+        columns = list(df.columns)
+        kinematics = sequence.kinematics
+        converted_sequence = deque()
+        for name, row in zip(df.index, df.itertuples(index=False, name=None)):
+            element = _SequenceElement(name, zip(columns, row))
+            converted_sequence.append(
+                elements_database.get(name,
+                                      conversion_functions.get(element['KEYWORD'], lambda _, __, ___: None)
+                                      (element, kinematics, options.get(element['KEYWORD'], {}))
+                                      )
+            )
         if with_beam and sequence.beam is not None:
             converted_sequence.appendleft(sequence.beam)
         return cls(
@@ -860,8 +1077,38 @@ class Input:
             validators: callables used to validate the input
         """
         _.validate(validators)
-        with open(os.path.join(path, filename), mode) as f:
-            return f.write(str(_))
+        n = 0
+        with open(os.path.join(path, filename), mode, buffering=1 << 20) as f:
+            for part in _.build_iter(_.name, _.line):
+                n += f.write(part)
+        return n
+
+    @staticmethod
+    def build_iter(name: str = 'beamline',
+                   line: Optional[Deque[_Command]] = None,
+                   overrides: Optional[Mapping[int, Mapping[str, Any]]] = None,
+                   ) -> Iterator[str]:
+        """Iterate over the parts of the string representing the complete input.
+
+        The parts are the name of the input followed by the Zgoubi serialization of each element (command) of the
+        input sequence. This allows to stream the input (e.g. to a file) without building the complete string.
+
+        Args:
+            name: the name of the resulting Zgoubi input.
+            line: the input sequence.
+            overrides: parameters overridden in the serialization, indexed by the `id` of the commands (see
+            `overrides`).
+
+        Returns:
+            an iterator over the parts of the input in a valid Zgoubi input format.
+        """
+        overrides = overrides or {}
+        yield name
+        for command in line:
+            o = overrides.get(id(command))
+            yield command.serialize() if o is None else command.render_with(o)
+        if len(line) == 0 or not isinstance(line[-1], _End):
+            yield str(_End())
 
     @staticmethod
     def build(name: str = 'beamline', line: Optional[Deque[_Command]] = None) -> str:
@@ -876,10 +1123,7 @@ class Input:
         Returns:
             a string in a valid Zgoubi input format.
         """
-        extra_end = None
-        if len(line) == 0 or not isinstance(line[-1], _End):
-            extra_end = [_End()]
-        return ''.join(map(str, [name] + (list(line) or []) + (extra_end or [])))
+        return ''.join(Input.build_iter(name, line))
 
     @classmethod
     def parse(cls, stream: str, debug: bool = False) -> Input:
@@ -892,9 +1136,10 @@ class Input:
         Returns:
 
         """
+        stream = _re.sub(r"[^\S\n]*\n[^\S\n]*", "\n", stream).strip()  # Strips all the lines at once
         return cls(
-            line=[getattr(zgoubidoo.commands, _parse.search("'{KEYWORD}'", c)['KEYWORD'].capitalize()).build(c, debug)
-                  for c in "\n".join([_.strip() for _ in stream.split('\n')]).strip('\n').split('\n\n')]
+            line=[getattr(zgoubidoo.commands, c.split("'", 2)[1].capitalize()).build(c, debug)  # The quoted keyword
+                  for c in stream.split('\n\n')]
         )
 
 
@@ -916,10 +1161,37 @@ class MadInput(Input):
         Returns:
             a string in a valid Zgoubi input format.
         """
-        extra_end = None
+        return ''.join(MadInput.build_iter(name, line))
+
+    @staticmethod
+    def build_iter(name: str = 'beamline',
+                   line: Optional[Deque[_Command]] = None,
+                   overrides: Optional[Mapping[int, Mapping[str, Any]]] = None,
+                   ) -> Iterator[str]:
+        """Iterate over the parts of the string representing the complete input.
+
+        The parts are the MAD-X serialization of each element (command) of the input sequence, separated by new lines.
+
+        Args:
+            name: the name of the resulting Zgoubi input (unused).
+            line: the input sequence.
+            overrides: parameters overridden in the serialization, indexed by the `id` of the commands (see
+            `Input.overrides`).
+
+        Returns:
+            an iterator over the parts of the input in a valid MAD-X input format.
+        """
+        line = line or []
+        overrides = overrides or {}
+        for i, command in enumerate(line):
+            if i > 0:
+                yield '\n'
+            o = overrides.get(id(command))
+            yield str(command) if o is None else command.render_with(o)
         if len(line) == 0 or not isinstance(line[-1], zgoubidoo.commands.madx.Stop):
-            extra_end = [zgoubidoo.commands.madx.Stop()]
-        return '\n'.join(map(str, (line or []) + (extra_end or [])))
+            if len(line) > 0:
+                yield '\n'
+            yield str(zgoubidoo.commands.madx.Stop())
 
 
 class ZgoubiInputValidator:
@@ -955,8 +1227,8 @@ class ZgoubiInputValidator:
         Returns:
             True is the validation is successful; otherwise a `ZgoubiInputException` is raised.
         """
-        objets = _[zgoubidoo.commands.Objet, zgoubidoo.commands.MCObjet]
-        for o in objets:
-            if (o.IMAX or 0.0) > ZGOUBI_IMAX:
+        objets_types = (zgoubidoo.commands.Objet, zgoubidoo.commands.MCObjet)
+        for o in _.line:  # Scanned in place, no filtered copy of the input is needed
+            if isinstance(o, objets_types) and (o.IMAX or 0.0) > ZGOUBI_IMAX:
                 raise ZgoubiInputException(f"Objet {o.label1} IMAX exceeds maximum value ({ZGOUBI_IMAX}).")
         return True
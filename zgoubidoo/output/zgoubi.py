@@ -1,6 +1,7 @@
 """TODO
 
 """
+import itertools
 import os
 import pandas as pd
 
@@ -24,9 +25,9 @@ def read_fai_file(filename: str = 'zgoubi.fai', path: str = '.') -> pd.DataFrame
     Raises:
         a FileNotFoundError in case the file is not found.
     """
-    # Header line from the Zgoubi .fai file
+    # Header line from the Zgoubi .fai file (only the first lines are read, the data is parsed by pandas)
     with open(os.path.join(path, filename)) as file:
-        headers = list(map(lambda s: s.strip(' '), file.read().split('\n')[2].split(',')))
+        headers = list(map(lambda s: s.strip(' '), next(itertools.islice(file, 2, None)).rstrip('\n').split(',')))
     return pd.read_csv(os.path.join(path, filename),
                        skiprows=4,
                        names=headers,
@@ -65,9 +66,9 @@ def read_plt_file(filename: str = 'zgoubi.plt', path: str = '.') -> pd.DataFrame
     Raises:
         a FileNotFoundError in case the file is not found.
     """
-    # Header line from the Zgoubi .plt file
+    # Header line from the Zgoubi .plt file (only the first lines are read, the data is parsed by pandas)
     with open(os.path.join(path, filename)) as file:
-        headers = list(map(lambda s: s.strip(' '), file.read().split('\n')[2].split(',')))
+        headers = list(map(lambda s: s.strip(' '), next(itertools.islice(file, 2, None)).rstrip('\n').split(',')))
     df = pd.read_csv(os.path.join(path, filename),
                      skiprows=4,
                      names=headers,
@@ -75,7 +76,7 @@ def read_plt_file(filename: str = 'zgoubi.plt', path: str = '.') -> pd.DataFrame
                      skipinitialspace=True,
                      quotechar='\''
                      )
-    df['LABEL1'] = df['LABEL1'].map(lambda x: x.strip())
+    df['LABEL1'] = df['LABEL1'].str.strip()
     df['X'] *= 1e-2
     df['S'] *= 1e-2
     df['Y'] = 1e-2 * df['Y-DY']
@@ -88,7 +89,7 @@ def read_plt_file(filename: str = 'zgoubi.plt', path: str = '.') -> pd.DataFrame
     df['Zo'] *= 1e-2
     df['Po'] *= 1e-3
     df['KEX'] = df['# KEX']
-    df['KEYWORD'] = df['KLEY'].apply(str.strip)
+    df['KEYWORD'] = df['KLEY'].str.strip()
     del df['# KEX']
     del df['KLEY']
 
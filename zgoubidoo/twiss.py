@@ -17,7 +17,8 @@ Example:
     _ = zgoubidoo.ureg
 
 """
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Union, Mapping, Dict
+import concurrent.futures
 import numpy as np
 import pandas as pd
 from .commands import PolarMagnet as _PolarMagnet
@@ -25,25 +26,38 @@ from .input import Input as _Input
 from .sequences.betablock import BetaBlock as _BetaBlock
 import zgoubidoo
 
+MatrixType = Union[pd.DataFrame, Mapping[str, np.ndarray]]
+"""Step-by-step transfer matrix, as a DataFrame or as a mapping of its columns (coefficients) to arrays."""
 
-def _get_parameters(m: pd.DataFrame, twiss: Optional[_BetaBlock], plane: int = 1) -> Tuple:
-    """Extract parameters from the DataFrame."""
-    p = 1 if plane == 1 else 3
+_MATRIX_COEFFICIENTS = {
+    1: ('R11', 'R12', 'R21', 'R22', 'R15', 'R25'),
+    2: ('R33', 'R34', 'R43', 'R44', 'R35', 'R45'),
+}
+"""Transfer matrix coefficients used for the parametrization of each plane."""
+
+_TWISS_PARAMETERS = {
+    1: ('ALPHA11', 'BETA11', 'GAMMA11'),
+    2: ('ALPHA22', 'BETA22', 'GAMMA22'),
+}
+"""Twiss parameters of each plane."""
+
+_TWISS_COLUMNS = ('BETA11', 'BETA22', 'ALPHA11', 'ALPHA22', 'GAMMA11', 'GAMMA22', 'MU1', 'MU2', 'DET1', 'DET2',
+                  'DISP1', 'DISP2', 'DISP3', 'DISP4')
+"""Columns computed by `compute_twiss` (in order)."""
+
+
+def _get_parameters(m: MatrixType, twiss: Optional[_BetaBlock], plane: int = 1) -> Tuple:
+    """Extract parameters from the DataFrame (or from the mapping of its columns)."""
     v = 1 if plane == 1 else 2
-    r11: pd.Series = m[f"R{p}{p}"]
-    r12: pd.Series = m[f"R{p}{p+1}"]
-    r21: pd.Series = m[f"R{p+1}{p}"]
-    r22: pd.Series = m[f"R{p+1}{p+1}"]
+    r11, r12, r21, r22 = (m[c] for c in _MATRIX_COEFFICIENTS[v][:4])
     if twiss is not None:
-        alpha: float = twiss[f"ALPHA{v}{v}"]
-        beta: float = twiss[f"BETA{v}{v}"]
-        gamma: float = twiss[f"GAMMA{v}{v}"]
+        alpha, beta, gamma = (twiss[p] for p in _TWISS_PARAMETERS[v])
         return r11, r12, r21, r22, alpha, beta, gamma
     else:
         return r11, r12, r21, r22
 
 
-def compute_alpha_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
+def compute_alpha_from_matrix(m: MatrixType, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
     """
     Computes the Twiss alpha values at every steps of the input step-by-step transfer matrix.
 
@@ -59,7 +73,7 @@ def compute_alpha_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1
     return -r11 * r21 * beta + r12 * r21 * alpha + r11 * r12 * gamma
 
 
-def compute_beta_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1, strict: bool = False) -> pd.Series:
+def compute_beta_from_matrix(m: MatrixType, twiss: _BetaBlock, plane: int = 1, strict: bool = False) -> pd.Series:
     """
     Computes the Twiss beta values at every steps of the input step-by-step transfer matrix.
 
@@ -79,7 +93,7 @@ def compute_beta_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1,
     return _
 
 
-def compute_gamma_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
+def compute_gamma_from_matrix(m: MatrixType, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
     """
     Computes the Twiss gamma values at every steps of the input step-by-step transfer matrix.
 
@@ -95,7 +109,7 @@ def compute_gamma_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1
     return r21**2 * beta - 2.0 * r21 * r22 * alpha + r22**2 * gamma
 
 
-def compute_mu_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
+def compute_mu_from_matrix(m: MatrixType, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
     """
     Computes the phase advance values at every steps of the input step-by-step transfer matrix.
 
@@ -111,7 +125,7 @@ def compute_mu_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1) -
     return np.arctan2(r12, r11 * beta - r12 * alpha)
 
 
-def compute_jacobian_from_matrix(m: pd.DataFrame, plane: int = 1) -> pd.Series:
+def compute_jacobian_from_matrix(m: MatrixType, plane: int = 1) -> pd.Series:
     """
     Computes the jacobian of the 2x2 transfer matrix (useful to verify the simplecticity).
 
@@ -126,7 +140,7 @@ def compute_jacobian_from_matrix(m: pd.DataFrame, plane: int = 1) -> pd.Series:
     return r11 * r22 - r12 * r21
 
 
-def compute_dispersion_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
+def compute_dispersion_from_matrix(m: MatrixType, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
     """
     Computes the dispersion function at every steps of the input step-by-step transfer matrix.
 
@@ -139,20 +153,18 @@ def compute_dispersion_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: in
         a Pandas Series with the dispersion function computed at all steps of the input step-by-step transfer matrix
 
     """
-    p = 1 if plane == 1 else 3
+    p = 1 if plane == 1 else 2
     if p == 1:
         d0 = twiss['DISP1']
         dp0 = twiss['DISP2']
     else:
         d0 = twiss['DISP3']
         dp0 = twiss['DISP4']
-    r11: pd.Series = m[f"R{p}{p}"]
-    r12: pd.Series = m[f"R{p}{p + 1}"]
-    r15: pd.Series = m[f"R{p}5"]
+    r11, r12, _, _, r15, _ = (m[c] for c in _MATRIX_COEFFICIENTS[p])
     return d0 * r11 + dp0 * r12 + r15
 
 
-def compute_dispersion_prime_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
+def compute_dispersion_prime_from_matrix(m: MatrixType, twiss: _BetaBlock, plane: int = 1) -> pd.Series:
     """
     Computes the dispersion prime function at every steps of the input step-by-step transfer matrix.
 
@@ -169,19 +181,50 @@ def compute_dispersion_prime_from_matrix(m: pd.DataFrame, twiss: _BetaBlock, pla
         >>> 1 + 1 # TODO
 
     """
-    p = 1 if plane == 1 else 3
+    p = 1 if plane == 1 else 2
     if p == 1:
         d0 = twiss['DISP1']
         dp0 = twiss['DISP2']
     else:
         d0 = twiss['DISP3']
         dp0 = twiss['DISP4']
-    r21: pd.Series = m[f"R{p + 1}{p}"]
-    r22: pd.Series = m[f"R{p + 1}{p + 1}"]
-    r25: pd.Series = m[f"R{p + 1}5"]
+    _, _, r21, r22, _, r25 = (m[c] for c in _MATRIX_COEFFICIENTS[p])
     return d0 * r21 + dp0 * r22 + r25
 
 
+def _compute_twiss_columns(m: Mapping[str, np.ndarray], twiss: _BetaBlock) -> Dict[str, np.ndarray]:
+    """
+    Computes all the Twiss columns for both planes at once, the products of coefficients being computed only once.
+
+    The results are identical to those of the individual `compute_*_from_matrix` functions.
+
+    Args:
+        m: the coefficients of the step-by-step transfer matrix (as arrays)
+        twiss: the initial Twiss values
+
+    Returns:
+        a dictionary with the computed columns (see `_TWISS_COLUMNS`).
+    """
+    columns = dict()
+    scratch = np.empty_like(m['R11'], dtype=float)  # Reused for the temporary products
+    for v in (1, 2):
+        r11, r12, r21, r22, r15, r25 = (m[c] for c in _MATRIX_COEFFICIENTS[v])
+        alpha, beta, gamma = (twiss[p] for p in _TWISS_PARAMETERS[v])
+        d0, dp0 = twiss[f"DISP{2 * v - 1}"], twiss[f"DISP{2 * v}"]
+        r11_r12 = r11 * r12
+        r12_r21 = r12 * r21
+        columns[f"BETA{v}{v}"] = r11**2 * beta - 2.0 * r11_r12 * alpha + r12**2 * gamma
+        columns[f"ALPHA{v}{v}"] = -r11 * r21 * beta + r12_r21 * alpha + r11_r12 * gamma
+        columns[f"GAMMA{v}{v}"] = r21**2 * beta - 2.0 * r21 * r22 * alpha + r22**2 * gamma
+        phase = r11 * beta
+        phase -= np.multiply(r12, alpha, out=scratch)
+        columns[f"MU{v}"] = np.arctan2(r12, phase, out=phase)
+        columns[f"DET{v}"] = r11 * r22 - r12_r21
+        columns[f"DISP{2 * v - 1}"] = d0 * r11 + dp0 * r12 + r15
+        columns[f"DISP{2 * v}"] = d0 * r21 + dp0 * r22 + r25
+    return columns
+
+
 def compute_periodic_twiss(matrix: pd.DataFrame) -> pd.Series:
     """
     Compute twiss parameters from a transfer matrix which is assumed to be a periodic transfer matrix.
@@ -199,12 +242,14 @@ def compute_periodic_twiss(matrix: pd.DataFrame) -> pd.Series:
     })
     twiss['MU1'] = np.arccos(twiss['CMU1'])
     twiss['MU2'] = np.arccos(twiss['CMU2'])
-    twiss['BETA11'] = m['R12'] / np.sin(twiss['MU1'])
-    twiss['BETA22'] = m['R34'] / np.sin(twiss['MU2'])
-    twiss['ALPHA11'] = (m['R11'] - m['R22']) / 2.0 / np.sin(twiss['MU1'])
-    twiss['ALPHA22'] = (m['R33'] - m['R44']) / 2.0 / np.sin(twiss['MU2'])
-    twiss['GAMMA11'] = -m['R21'] / np.sin(twiss['MU1'])
-    twiss['GAMMA22'] = -m['R43'] / np.sin(twiss['MU2'])
+    smu1 = np.sin(twiss['MU1'])
+    smu2 = np.sin(twiss['MU2'])
+    twiss['BETA11'] = m['R12'] / smu1
+    twiss['BETA22'] = m['R34'] / smu2
+    twiss['ALPHA11'] = (m['R11'] - m['R22']) / 2.0 / smu1
+    twiss['ALPHA22'] = (m['R33'] - m['R44']) / 2.0 / smu2
+    twiss['GAMMA11'] = -m['R21'] / smu1
+    twiss['GAMMA22'] = -m['R43'] / smu2
     twiss['DY'] = m['R15']
     twiss['DYP'] = m['R25']
     twiss['DZ'] = m['R35']
@@ -213,6 +258,45 @@ def compute_periodic_twiss(matrix: pd.DataFrame) -> pd.Series:
     return pd.Series(twiss)
 
 
+def _phase_unrolling(phi: np.ndarray) -> np.ndarray:
+    """
+    Unrolls the phase advance: negative values are shifted by 2 pi and the following values are shifted by a further
+    2 pi at each turn (decrease of the phase advance).
+
+    The shifts of the following values are accumulated in a running offset, added once to each value, instead of
+    shifting the whole tail of the array at each turn.
+
+    Args:
+        phi: the phase advance values
+
+    Returns:
+        a new array with the unrolled phase advance.
+    """
+    phi = phi.copy()
+    turns = 0
+    offset = 0.0
+    if phi[0] < 0:
+        phi[0] += 2 * np.pi
+    for i in range(1, phi.shape[0] - 1):
+        phi[i] += offset
+        if phi[i] < 0:
+            phi[i] += 2 * np.pi
+        if phi[i - 1] - phi[i] > 0.5:
+            phi[i] += 2 * np.pi
+            turns += 1
+            offset = turns * 2 * np.pi
+    if phi.shape[0] > 1:
+        phi[-1] += offset
+    return phi
+
+
+try:
+    from numba import njit as _njit
+    _phase_unrolling = _njit(cache=True)(_phase_unrolling)
+except ModuleNotFoundError:
+    pass
+
+
 def compute_twiss(matrix: pd.DataFrame,
                   twiss_init: Optional[_BetaBlock] = None,
                   with_phase_unrolling: bool = True
@@ -233,49 +317,51 @@ def compute_twiss(matrix: pd.DataFrame,
     if twiss_init is None:
         twiss_init = compute_periodic_twiss(matrix)
 
-    matrix['BETA11'] = compute_beta_from_matrix(matrix, twiss_init)
-    matrix['BETA22'] = compute_beta_from_matrix(matrix, twiss_init, plane=2)
-    matrix['ALPHA11'] = compute_alpha_from_matrix(matrix, twiss_init)
-    matrix['ALPHA22'] = compute_alpha_from_matrix(matrix, twiss_init, plane=2)
-    matrix['GAMMA11'] = compute_gamma_from_matrix(matrix, twiss_init)
-    matrix['GAMMA22'] = compute_gamma_from_matrix(matrix, twiss_init, plane=2)
-    matrix['MU1'] = compute_mu_from_matrix(matrix, twiss_init)
-    matrix['MU2'] = compute_mu_from_matrix(matrix, twiss_init, plane=2)
-    matrix['DET1'] = compute_jacobian_from_matrix(matrix)
-    matrix['DET2'] = compute_jacobian_from_matrix(matrix, plane=2)
-    matrix['DISP1'] = compute_dispersion_from_matrix(matrix, twiss_init)
-    matrix['DISP2'] = compute_dispersion_prime_from_matrix(matrix, twiss_init)
-    matrix['DISP3'] = compute_dispersion_from_matrix(matrix, twiss_init, plane=2)
-    matrix['DISP4'] = compute_dispersion_prime_from_matrix(matrix, twiss_init, plane=2)
-
-    def phase_unrolling(phi):
-        """TODO"""
-        if phi[0] < 0:
-            phi[0] += 2 * np.pi
-        for i in range(1, phi.shape[0] - 1):
-            if phi[i] < 0:
-                phi[i] += 2 * np.pi
-            if phi[i - 1] - phi[i] > 0.5:
-                phi[i:] += 2 * np.pi
-        return phi
-
-    try:
-        from numba import njit
-        phase_unrolling = njit(phase_unrolling)
-    except ModuleNotFoundError:
-        pass
-
+    # The coefficients are extracted once and the computations are done on the arrays
+    m = {c: matrix[c].to_numpy() for coefficients in _MATRIX_COEFFICIENTS.values() for c in coefficients}
+    columns = _compute_twiss_columns(m, twiss_init)
     if with_phase_unrolling:
-        matrix['MU1'] = phase_unrolling(matrix['MU1'].values)
-        matrix['MU2'] = phase_unrolling(matrix['MU2'].values)
+        columns['MU1'] = _phase_unrolling(columns['MU1'])
+        columns['MU2'] = _phase_unrolling(columns['MU2'])
+
+    # All the columns are added at once, as a single block (the input DataFrame is still modified in place)
+    matrix[list(_TWISS_COLUMNS)] = pd.DataFrame(columns, index=matrix.index, columns=_TWISS_COLUMNS)
 
     return matrix
 
 
+def _is_monotonous(values: np.ndarray) -> bool:
+    """
+    Checks that values are monotonously increasing.
+
+    Args:
+        values: the values to check
+
+    Returns:
+        True if the values are monotonously increasing, False otherwise.
+    """
+    return bool(np.all(np.diff(values) >= 0))
+
+
+try:
+    from numba import njit as _njit
+
+    @_njit(cache=True)
+    def _is_monotonous(values: np.ndarray) -> bool:  # noqa: F811
+        """Loop version of the monotony check, stopping at the first decrease and without temporary array."""
+        for i in range(1, values.shape[0]):
+            if not values[i] >= values[i - 1]:  # Also fails on NaN, as the comparison of the differences does
+                return False
+        return True
+except ModuleNotFoundError:
+    pass
+
+
 def align_tracks(tracks: pd.DataFrame,
                  align_on: str = 'S',
                  identifier: str = 'LET',
-                 reference_track: str = 'O') -> Tuple[np.array, pd.DataFrame]:
+                 reference_track: str = 'O',
+                 dtype: np.dtype = np.float64) -> Tuple[np.array, pd.DataFrame]:
     """
     Align the tracks to obtain a homegenous array with all coordinates given at the same location.
 
@@ -287,40 +373,134 @@ def align_tracks(tracks: pd.DataFrame,
         align_on: coordinates on which the tracks are aligned (typically 'X' or 'S')
         identifier: identifier of the column used for the particles indexing
         reference_track:
+        dtype: the type of the aligned data (e.g. `np.float32` to halve the memory footprint of large tracking data, at
+        the expense of precision)
 
     Returns:
         aligned data and reference data
     """
     coordinates: list = ['Y', 'T', 'Z', 'P', 'D-1', 'Yo', 'To', 'Zo', 'Po', 'Do-1']  # Keep it in this order
     particules: list = ['O', 'A', 'C', 'E', 'G', 'I', 'B', 'D', 'F', 'H', 'J']  # Keep it in this order
-    assert set(particules) == set(tracks[identifier].unique()), "Required particles not found (are you using Objet5?)."
-    ref: pd.DataFrame = tracks.query(f"{identifier} == '{reference_track}'")[coordinates +
-                                                                             [align_on, 'LABEL1', 'XG', 'YG', 'ZG']]
+    groups = dict(tuple(tracks.groupby(identifier, sort=False, observed=True)))  # A single pass over the tracks
+    assert set(particules) == set(groups.keys()), "Required particles not found (are you using Objet5?)."
+    ref: pd.DataFrame = groups[reference_track][coordinates + [align_on, 'LABEL1', 'XG', 'YG', 'ZG']]
     ref_alignment_values = ref[align_on].values
-    assert np.all(np.diff(ref_alignment_values) >= 0), "The reference alignment values are not monotonously increasing"
-    data = np.zeros((len(particules), ref_alignment_values.shape[0], len(coordinates)))
-    data[0, :, :] = ref[coordinates].values
+    ref_alignment_steps = np.diff(ref_alignment_values)
+    assert np.all(ref_alignment_steps >= 0), "The reference alignment values are not monotonously increasing"
+    # Particles tracked at the very same (strictly increasing) locations as the reference need no interpolation
+    ref_strictly_increasing = np.all(ref_alignment_steps > 0)
+    # Filled with contiguous values for each coordinate, the (particules, steps, coordinates) view is returned
+    aligned = np.zeros((len(particules), len(coordinates), ref_alignment_values.shape[0]), dtype=dtype)
+    aligned[0, :, :] = ref[coordinates].values.T
     for i, p in enumerate(particules[1:]):
-        particule = tracks.query(f"{identifier} == '{p}'")
-        for j, c in enumerate(coordinates):
+        particule = groups[p]
+        alignment_values = particule[align_on].values
+        assert _is_monotonous(alignment_values), "The alignment values are not monotonously increasing"
+        values = particule[coordinates].values
+        if ref_strictly_increasing and np.array_equal(alignment_values, ref_alignment_values):
+            aligned[i+1, :, :] = values.T
+            continue
+        for j in range(len(coordinates)):
             try:
-                assert np.all(np.diff(particule[align_on].values) >= 0), \
-                    "The alignment values are not monotonously increasing"
-                data[i+1, :, j] = np.interp(ref_alignment_values, particule[align_on].values, particule[c].values)
+                aligned[i+1, j, :] = np.interp(ref_alignment_values, alignment_values, values[:, j])
             except ValueError:
                 pass
+    data = aligned.transpose(0, 2, 1)
     assert data.ndim == 3, "The aligned tracks do not form a homogenous array."
     return data, ref
 
 
-def compute_transfer_matrix(beamline: _Input, tracks: pd.DataFrame) -> pd.DataFrame:
+def _transfer_matrix_coefficients(data: np.ndarray) -> np.ndarray:
+    """
+    Computes the transfer matrix coefficients at each step from the aligned tracks of the 11 particles.
+
+    Args:
+        data: the aligned tracks, with shape (particles, steps, coordinates)
+
+    Returns:
+        an array with shape (steps, 25) where column 5 * i + j holds the coefficient R{j + 1}{i + 1}.
+    """
+    n_dimensions: int = 5
+    d = np.arange(n_dimensions)
+    # Normalization of each dimension i (first axis), at each step
+    normalization = 2 * (data[d + 1, :, d + n_dimensions] - data[0, :, n_dimensions:].T)
+    # Element (i, step, j) is the coefficient R{j + 1}{i + 1} at each step
+    r = (data[1:n_dimensions + 1, :, :n_dimensions] - data[n_dimensions + 1:, :, :n_dimensions]) \
+        / normalization[:, :, np.newaxis]
+    return r.transpose(1, 0, 2).reshape(data.shape[1], n_dimensions ** 2)
+
+
+try:
+    from numba import njit as _njit
+
+    @_njit(cache=True)
+    def _transfer_matrix_coefficients(data: np.ndarray) -> np.ndarray:  # noqa: F811
+        """Loop version of the transfer matrix coefficients computation, compiled without temporary arrays."""
+        n_dimensions = 5
+        coefficients = np.empty((data.shape[1], n_dimensions ** 2), dtype=data.dtype)
+        for k in range(data.shape[1]):
+            for i in range(n_dimensions):
+                normalization = 2 * (data[i + 1, k, i + n_dimensions] - data[0, k, i + n_dimensions])
+                for j in range(n_dimensions):
+                    coefficients[k, n_dimensions * i + j] = \
+                        (data[i + 1, k, j] - data[i + n_dimensions + 1, k, j]) / normalization
+        return coefficients
+except ModuleNotFoundError:
+    pass
+
+
+def _compute_element_transfer_matrix(tracks: pd.DataFrame,
+                                     label: str,
+                                     radius: Optional[float],
+                                     dtype: np.dtype = np.float64) -> pd.DataFrame:
+    """
+    Constructs the step-by-step transfer matrix of a single element from its tracking data (see
+    `compute_transfer_matrix`).
+
+    Args:
+        tracks: tracking data of the element
+        label: the LABEL1 of the element
+        radius: the reference radius of the element in meters (polar magnets), None otherwise
+        dtype: the type used for the aligned tracks and the transfer matrix coefficients
+
+    Returns:
+        a Panda DataFrame representing the transfer matrix of the element
+    """
+    data, ref = align_tracks(tracks, dtype=dtype)
+    n_dimensions: int = 5
+    m = pd.DataFrame(
+        _transfer_matrix_coefficients(data),
+        columns=[f"R{j + 1}{i + 1}" for i in range(0, n_dimensions) for j in range(0, n_dimensions)],
+    )
+    if radius is not None:
+        m['S'] = ref['S'].values * 100 * radius
+    else:
+        m['S'] = ref['S'].values
+    m['LABEL1'] = label
+    m['XG'] = ref['XG'].values
+    m['YG'] = ref['YG'].values
+    m['ZG'] = ref['ZG'].values
+    return m
+
+
+def compute_transfer_matrix(beamline: _Input,
+                            tracks: pd.DataFrame,
+                            n_procs: int = 1,
+                            dtype: np.dtype = np.float64) -> pd.DataFrame:
     """
     Constructs the step-by-step transfer matrix from tracking data (finite differences). The approximation
     uses the O(3) formula (not just the O(1) formula) and therefore makes use of all the 11 particles.
 
+    The transfer matrices of the elements are independent and can be computed in parallel in separate processes;
+    this is only worthwhile for long beamlines with large tracking data.
+
     Args:
         beamline: the Zgoubidoo Input beamline
         tracks: tracking data
+        n_procs: number of processes used to compute the transfer matrices of the elements (default: 1, no
+        additional process)
+        dtype: the type used for the aligned tracks and the transfer matrix coefficients (e.g. `np.float32` for large
+        tracking data, at the expense of precision)
 
     Returns:
         a Panda DataFrame representing the transfer matrix
@@ -332,34 +512,17 @@ def compute_transfer_matrix(beamline: _Input, tracks: pd.DataFrame) -> pd.DataFr
         >>> zi = zgoubidoo.Input()
         >>> matrix = zgoubidoo.twiss.compute_transfer_matrix(zi, tracks)
     """
-    elements = tracks.LABEL1.unique()
-    matrix = pd.DataFrame()
-    for e in beamline.line:
-        if e.LABEL1 not in elements:
-            continue
-        t = tracks[tracks.LABEL1 == e.LABEL1]
-        data, ref = align_tracks(t)
-        n_dimensions: int = 5
-        normalization = [2 * (data[i + 1, :, i + n_dimensions] - data[0, :, i + n_dimensions])
-                         for i in range(0, n_dimensions)
-                         ]
-        m = pd.DataFrame(
-            {
-                f"R{j + 1}{i + 1}": pd.Series(
-                    (data[i + 1, :, j] - data[i + 1 + n_dimensions, :, j]) / normalization[i]
-                )
-                for i in range(0, n_dimensions)
-                for j in range(0, n_dimensions)
-            }
-        )
-        if isinstance(e, _PolarMagnet):
-            m['S'] = ref['S'].values * 100 * e.radius.to('m').magnitude
-        else:
-            m['S'] = ref['S'].values
-        m['LABEL1'] = e.LABEL1
-        m['XG'] = ref['XG'].values
-        m['YG'] = ref['YG'].values
-        m['ZG'] = ref['ZG'].values
-        matrix = matrix.append(m)
+    # A single pass over the tracks; only the labels present in the tracks are kept if LABEL1 is categorical
+    elements = dict(tuple(tracks.groupby('LABEL1', sort=False, observed=True)))
+    arguments = [
+        (elements[label], label, e.radius.to('m').magnitude if isinstance(e, _PolarMagnet) else None, dtype)
+        for e, label in zip(beamline.line, beamline.labels) if label in elements
+    ]
+    if n_procs > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_procs) as executor:
+            matrices = list(executor.map(_compute_element_transfer_matrix, *zip(*arguments)))
+    else:
+        matrices = [_compute_element_transfer_matrix(*a) for a in arguments]
+    matrix = pd.concat(matrices) if matrices else pd.DataFrame()  # Concatenated once at the end
     matrix['S'] += tracks['XG'].min()
     return matrix.reset_index()
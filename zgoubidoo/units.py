@@ -1,7 +1,10 @@
-from typing import Union, Callable
+from typing import Union, Callable, Dict, Tuple
 from . import ureg as _ureg
 from . import _Q
 
+_CONVERSION_FACTORS: Dict[Tuple[_ureg.Unit, str], float] = {}
+"""Cache of the multiplicative factors between the units of the quantities and the target units."""
+
 
 def parse_quantity(f: Callable):
     """Decorator to convert argument 'q' from a string to a quantity."""
@@ -13,6 +16,28 @@ def parse_quantity(f: Callable):
     return parse_arg
 
 
+def _convert(q: _Q, units: str) -> float:
+    """
+    Convert a quantity to the given units using a cached conversion factor.
+
+    The conversion factor between the units of the quantity and the target units is computed once with Pint and then
+    reused for all the subsequent conversions.
+
+    >>> _convert(1 * _ureg.km, 'cm')
+    100000.0
+
+    :param q: the quantity
+    :param units: the target units
+    :return: the magnitude in the target units.
+    """
+    key = (q.units, units)
+    try:
+        factor = _CONVERSION_FACTORS[key]
+    except KeyError:
+        factor = _CONVERSION_FACTORS[key] = _Q(1.0, q.units).to(units).magnitude
+    return float(q.magnitude * factor)
+
+
 @parse_quantity
 def _m(q: Union[str, _Q]) -> float:
     """
@@ -24,7 +49,7 @@ def _m(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in meters.
     """
-    return float(q.to('m').magnitude)
+    return _convert(q, 'm')
 
 
 @parse_quantity
@@ -38,7 +63,7 @@ def _cm(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in centimeters.
     """
-    return float(q.to('cm').magnitude)
+    return _convert(q, 'cm')
 
 
 @parse_quantity
@@ -52,7 +77,7 @@ def _mm(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in millimeters.
     """
-    return float(q.to('mm').magnitude)
+    return _convert(q, 'mm')
 
 
 @parse_quantity
@@ -68,7 +93,7 @@ def _degree(q: Union[str, _Q]) -> float:
     :param q: the quantity
     :return: the magnitude in degrees.
     """
-    return float(q.to('degree').magnitude)
+    return _convert(q, 'degree')
 
 
 @parse_quantity
@@ -82,7 +107,7 @@ def _radian(q: Union[str, _Q]) -> float:
     :param q: the quantity
     :return: the magnitude in degrees.
     """
-    return float(q.to('radian').magnitude)
+    return _convert(q, 'radian')
 
 
 @parse_quantity
@@ -96,7 +121,7 @@ def _tesla(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in meters.
     """
-    return float(q.to('tesla').magnitude)
+    return _convert(q, 'tesla')
 
 
 @parse_quantity
@@ -110,7 +135,7 @@ def _gauss(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in meters.
     """
-    return float(q.to('gauss').magnitude)
+    return _convert(q, 'gauss')
 
 
 @parse_quantity
@@ -124,7 +149,7 @@ def _kilogauss(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in meters.
     """
-    return float(q.to('kilogauss').magnitude)
+    return _convert(q, 'kilogauss')
 
 
 @parse_quantity
@@ -138,7 +163,7 @@ def _mev(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [length]**2 * [mass] * [time]**-2.0
     :return: the magnitude in MeV.
     """
-    return float(q.to('MeV').magnitude)
+    return _convert(q, 'MeV')
 
 
 @parse_quantity
@@ -152,7 +177,7 @@ def _gev(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [length]**2 * [mass] * [time]**-2.0
     :return: the magnitude in MeV.
     """
-    return float(q.to('GeV').magnitude)
+    return _convert(q, 'GeV')
 
 
 @parse_quantity
@@ -169,7 +194,7 @@ def _mev_c(q: _Q) -> float:
     Returns:
         the magnitude in meters.
     """
-    return float(q.to('MeV_c').magnitude)
+    return _convert(q, 'MeV_c')
 
 
 @parse_quantity
@@ -186,4 +211,4 @@ def _gev_c(q: _Q) -> float:
     Returns:
         the magnitude in meters.
     """
-    return float(q.to('GeV_c').magnitude)
+    return _convert(q, 'GeV_c')
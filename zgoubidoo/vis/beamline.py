@@ -39,6 +39,7 @@ def beamline(line: zgoubidoo.Input,
             e.plot(artist=artist, apertures=True)
         if tracks is not None and with_tracks:
             e.plot_tracks(artist=artist, tracks=tracks.query(f"LABEL1 == '{e.LABEL1}'"))
+    artist.flush()
 
 
 def cartouche(line: zgoubidoo.Input,
@@ -3,11 +3,13 @@
 TODO
 """
 from __future__ import annotations
+from typing import Dict, List, Tuple
+from collections import defaultdict
 import numpy as _np
 import pandas as _pd
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
-import matplotlib.transforms as transforms
+from matplotlib.path import Path
 from .. import ureg as _ureg
 from .zgoubiplot import ZgoubiPlot
 from ..units import _m, _cm, _degree, _radian
@@ -36,10 +38,13 @@ class ZgoubiMpl(ZgoubiPlot):
         super().__init__(with_boxes, with_frames, **kwargs)
         self._with_centers = with_centers
         self._tracks_color = tracks_color
+        self._boxes: Dict[str, List[Tuple[float, ...]]] = defaultdict(list)
+        self._frames: Dict[Tuple[str, int], List[Tuple[float, float]]] = defaultdict(list)
         if ax is None:
             self.init_plot(**kwargs)
         else:
             self._ax = ax
+            self._fig = ax.figure
         self._ax2 = self._ax.twinx()
         self._ax2.set_ylim([0, 1])
         self._ax2.axis('off')
@@ -89,17 +94,31 @@ class ZgoubiMpl(ZgoubiPlot):
     def ax(self, ax):
         self._ax = ax
 
-    def init_plot(self, figsize=(12, 8), subplots=111):
+    def init_plot(self, figsize=(12, 8), subplots=111, num=None):
         """
         Initialize the Matplotlib figure and ax.
 
         Args:
             subplots: number of subplots
             figsize: figure size
+            num: identifier of the figure; if a figure with that identifier already exists it is cleared and reused
+            instead of creating a new one (useful when plotting repeatedly, e.g. in parametric scans).
         """
-        self._fig = plt.figure(figsize=figsize)
+        self._fig = plt.figure(num=num, figsize=figsize, clear=num is not None)
         self._ax = self._fig.add_subplot(subplots)
 
+    def clear(self):
+        """Remove all the rendered elements.
+
+        The figure and the axes (with their limits, labels, etc.) are kept, so that the artist can be reused to render
+        another beamline without creating a new figure.
+        """
+        for ax in (self._ax, self._ax2):
+            for artist in [*ax.patches, *ax.lines, *ax.collections]:
+                artist.remove()
+        self._boxes.clear()
+        self._frames.clear()
+
     def plot(self, *args, **kwargs):
         """Proxy for matplotlib.pyplot.plot
 
@@ -107,6 +126,53 @@ class ZgoubiMpl(ZgoubiPlot):
         """
         self._ax.plot(*args, **kwargs)
 
+    def flush(self):
+        """Render the accumulated boxes and frames.
+
+        The boxes and frames of the cartesian magnets are accumulated while the beamline is rendered and added to the
+        ax in a single batch (one compound path per color for the boxes and one line per frame marker style).
+        """
+        for color, boxes in self._boxes.items():
+            self._ax.add_patch(
+                patches.PathPatch(
+                    ZgoubiMpl._boxes_path(_np.array(boxes)),
+                    alpha=0.2,
+                    facecolor=color,
+                    edgecolor=color,
+                    linewidth=2,
+                )
+            )
+        for (marker, ms), points in self._frames.items():
+            x, y = zip(*points)
+            self.plot(x, y, marker, ms=ms)
+        self._boxes.clear()
+        self._frames.clear()
+
+    @staticmethod
+    def _boxes_path(boxes: _np.ndarray) -> Path:
+        """Build a single compound path for a set of rotated rectangles.
+
+        Args:
+            boxes: array of shape (N, 6), each row being the rotation center (x, y), the length, the lower edge offset
+            and the width of a rectangle (all in meters) followed by its rotation angle (in radians).
+
+        Returns:
+            a compound path with one closed polygon per rectangle.
+        """
+        x0, y0, length, offset, width, angle = boxes.T
+        zeros = _np.zeros_like(length)
+        local = _np.stack([
+            _np.stack([zeros, offset], axis=-1),
+            _np.stack([length, offset], axis=-1),
+            _np.stack([length, offset + width], axis=-1),
+            _np.stack([zeros, offset + width], axis=-1),
+        ], axis=1)
+        rotations = _np.array([[_np.cos(angle), -_np.sin(angle)], [_np.sin(angle), _np.cos(angle)]]).transpose(2, 0, 1)
+        vertices = _np.zeros((boxes.shape[0], 5, 2))
+        vertices[:, :4, :] = _np.einsum('nij,nkj->nki', rotations, local) + _np.stack([x0, y0], axis=-1)[:, None, :]
+        codes = _np.tile([Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY], boxes.shape[0])
+        return Path(vertices.reshape(-1, 2), codes)
+
     def polarmagnet(self, magnet: zgoubidoo.commands.PolarMagnet):
         """Rendering of magnets in polar coordinates.
 
@@ -221,88 +287,29 @@ class ZgoubiMpl(ZgoubiPlot):
 
         def do_frame():
             """Plot the coordinates of each frames of the magnet."""
-            self.plot(_m(magnet.entry.x), _m(magnet.entry.y), 'gv', ms=5)
-            self.plot(_m(magnet.entry_patched.x), _m(magnet.entry_patched.y), 'bs', ms=5)
-            self.plot(_m(magnet.exit.x), _m(magnet.exit.y), 'k^', ms=5)
-            self.plot(_m(magnet.exit_patched.x), _m(magnet.exit_patched.y), 'r>', ms=5)
+            self._frames[('gv', 5)].append(tuple(magnet.entry._get_origin()[:2]))
+            self._frames[('bs', 5)].append(tuple(magnet.entry_patched._get_origin()[:2]))
+            self._frames[('k^', 5)].append(tuple(magnet.exit._get_origin()[:2]))
+            self._frames[('r>', 5)].append(tuple(magnet.exit_patched._get_origin()[:2]))
+
+        def add_boxes(*offsets: float):
+            """Add boxes along the core of the magnet, with the given offsets of their lower edges (in meters)."""
+            x0, y0, _ = magnet.entry_patched._get_origin()
+            x1, y1, _ = magnet.exit._get_origin()
+            length = _np.hypot(x1 - x0, y1 - y0)
+            width = _m(magnet.WIDTH)
+            angle = -magnet.entry_patched._get_tx()
+            self._boxes[self._palette.get(magnet.COLOR, 'gray')].extend(
+                (x0, y0, length, offset, width, angle) for offset in offsets
+            )
 
         def do_box():
             """Plot the core of the magnet."""
-            angle = -magnet.entry_patched.tx
-            tr = transforms.Affine2D().rotate_deg_around(
-                _m(magnet.entry_patched.x),
-                _m(magnet.entry_patched.y),
-                _degree(angle)
-            ) + self._ax.transData
-            self._ax.add_patch(
-                patches.Rectangle(
-                    (
-                        _m(magnet.entry_patched.x),
-                        _m(magnet.entry_patched.y - magnet.WIDTH / 2)
-                    ),
-                    _np.linalg.norm(
-                        _np.array([
-                            _m(magnet.exit.x - magnet.entry_patched.x),
-                            _m(magnet.exit.y - magnet.entry_patched.y)
-                        ]).astype(float)
-                    ),
-                    _m(magnet.WIDTH),
-                    alpha=0.2,
-                    facecolor=self._palette.get(magnet.COLOR, 'gray'),
-                    edgecolor=self._palette.get(magnet.COLOR, 'gray'),
-                    linewidth=2,
-                    transform=tr,
-                )
-            )
+            add_boxes(-_m(magnet.WIDTH / 2))
 
         def do_apertures():
             """Plot the core of the magnet."""
-            angle = -magnet.entry_patched.tx
-            tr = transforms.Affine2D().rotate_deg_around(
-                _m(magnet.entry_patched.x),
-                _m(magnet.entry_patched.y),
-                _degree(angle)
-            ) + self._ax.transData
-            self._ax.add_patch(
-                patches.Rectangle(
-                    (
-                        _m(magnet.entry_patched.x),
-                        _m(magnet.entry_patched.y - magnet.APERTURE_RIGHT - magnet.WIDTH)
-                    ),
-                    _np.linalg.norm(
-                        _np.array([
-                            _m(magnet.exit.x - magnet.entry_patched.x),
-                            _m(magnet.exit.y - magnet.entry_patched.y)
-                        ]).astype(float)
-                    ),
-                    _m(magnet.WIDTH),
-                    alpha=0.2,
-                    facecolor=self._palette.get(magnet.COLOR, 'gray'),
-                    edgecolor=self._palette.get(magnet.COLOR, 'gray'),
-                    linewidth=2,
-                    transform=tr,
-                )
-            )
-            self._ax.add_patch(
-                patches.Rectangle(
-                    (
-                        _m(magnet.entry_patched.x),
-                        _m(magnet.entry_patched.y + 1 * magnet.APERTURE_LEFT)
-                    ),
-                    _np.linalg.norm(
-                        _np.array([
-                            _m(magnet.exit.x - magnet.entry_patched.x),
-                            _m(magnet.exit.y - magnet.entry_patched.y)
-                        ]).astype(float)
-                    ),
-                    _m(magnet.WIDTH),
-                    alpha=0.2,
-                    facecolor=self._palette.get(magnet.COLOR, 'gray'),
-                    edgecolor=self._palette.get(magnet.COLOR, 'gray'),
-                    linewidth=2,
-                    transform=tr,
-                )
-            )
+            add_boxes(-_m(magnet.APERTURE_RIGHT + magnet.WIDTH), _m(magnet.APERTURE_LEFT))
 
         if self._with_boxes and not apertures:
             do_box()
@@ -54,6 +54,14 @@ class ZgoubiPlot:
     def reference_frame(self, frame):
         self._reference_frame = frame
 
+    def flush(self):
+        """Render all the elements accumulated by the artist (if any).
+
+        Artists may defer the rendering of the elements to render them in a single batch, this is called once all the
+        elements of a beamline have been processed.
+        """
+        pass
+
     def cartesianmagnet(self, magnet: zgoubidoo.commands.CartesianMagnet):
         """
 
@@ -8,7 +8,10 @@
 
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, Mapping, Iterable, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Iterable, Optional, Tuple, Union
+from functools import lru_cache
+import bisect
+import concurrent.futures
 import logging
 import tempfile
 import os
@@ -20,6 +23,7 @@ from . import ureg as _ureg
 import zgoubidoo
 from .constants import ZGOUBI_INPUT_FILENAME as _ZGOUBI_INPUT_FILENAME
 if TYPE_CHECKING:
+    from .commands import Command as _Command
     from .input import Input as _Input
     from .input import MappedParametersType as _MappedParametersType
     from .input import MappedParametersListType as _MappedParametersListType
@@ -27,6 +31,79 @@ if TYPE_CHECKING:
 __all__ = ['ZgoubiException', 'ZgoubiResults', 'Zgoubi']
 _logger = logging.getLogger(__name__)
 
+RESULTS_READERS: int = min(8, os.cpu_count() or 1)
+"""Number of threads used to read the output files of the runs when collecting the results."""
+
+
+@lru_cache(maxsize=1024)
+def _string_to_base_units(value: str) -> float:
+    """Magnitude in base units of a parameter value given as a string (cached, the values being shared by the runs)."""
+    return _ureg.Quantity(value).to_base_units().m
+
+
+def _to_base_units(value: Any) -> Any:
+    """Magnitude in base units of a parameter value; plain numbers (dimensionless) are returned as they are."""
+    if isinstance(value, str):
+        return _string_to_base_units(value)
+    if isinstance(value, _ureg.Quantity):
+        return value.to_base_units().m
+    if isinstance(value, (int, float, _np.number)) and not isinstance(value, bool):
+        return value
+    return _ureg.Quantity(value).to_base_units().m
+
+
+def _find_labeled_outputs(out: Iterable[str],
+                          labels_keywords: Iterable[Tuple[str, str]],
+                          ) -> Dict[Tuple[str, str], List[str]]:
+    """
+    Process the Zgoubi output in a single pass and retrieves the output data of multiple labeled elements.
+
+    The output of each element is the same as the one retrieved by `Zgoubi.find_labeled_output`. The positions of the
+    header and separator lines are located first; the candidate elements of a header line are then looked up from its
+    tokens, so that each header is only tested against the elements it can match, and the output of each element is
+    sliced at once from its header to the next separator.
+
+    Args:
+        out: the Zgoubi output
+        labels_keywords: the labels and keywords of the elements to be retrieved
+
+    Returns:
+        a dictionary with the output of each (label, keyword) pair.
+    """
+    def is_header(line: str, label: str, keyword: str) -> bool:
+        return ' ' + label + ' ' in line and 'Keyword' in line and keyword in line  # This might be a bit fragile
+
+    out = out if isinstance(out, list) else list(out)
+    data: Dict[Tuple[str, str], List[str]] = dict()
+    by_label: Dict[str, List[Tuple[str, str]]] = dict()
+    others: List[Tuple[str, str]] = list()  # Labels which cannot be a token of a line (empty, with blanks)
+    for label, keyword in labels_keywords:
+        if (label, keyword) in data:
+            continue
+        data[(label, keyword)] = []
+        if label and label.split() == [label]:
+            by_label.setdefault(label, []).append((label, keyword))
+        else:
+            others.append((label, keyword))
+    headers = [i for i, l in enumerate(out) if 'Keyword' in l]
+    separators = [i for i, l in enumerate(out) if '****' in l]  # This might be a bit fragile
+    starts: Dict[Tuple[str, str], int] = dict()
+    for i in headers:
+        l = out[i]
+        for label, keyword in [p for t in set(l.split()) for p in by_label.get(t, ())] + others:
+            if (label, keyword) not in starts and is_header(l, label, keyword):
+                starts[(label, keyword)] = i
+        if len(starts) == len(data):
+            break
+    for (label, keyword), i in starts.items():
+        end = len(out)
+        for j in separators[bisect.bisect_right(separators, i):]:
+            if not is_header(out[j], label, keyword):  # The headers of the element itself do not end its output
+                end = j
+                break
+        data[(label, keyword)] = [l for l in out[i:end] if len(l)]
+    return data
+
 
 class ZgoubiException(Exception):
     """Exception raised for errors when running Zgoubi."""
@@ -55,11 +132,21 @@ class ZgoubiResults:
         """
         self._options: Mapping = options or {}
         self._results: List[Mapping] = results
+        # The fields used to collect the data are extracted once, the paths (temporary directories or strings) of the
+        # runs being resolved
+        self._mappings: List[_MappedParametersType] = [r['mapping'] for r in results]
+        self._paths: List[Union[str, tempfile.TemporaryDirectory]] = [r['path'] for r in results]
+        self._paths_names: List[str] = [getattr(p, 'name', p) for p in self._paths]
+        self._results_pairs: Optional[List[Tuple[_MappedParametersType, Mapping]]] = None
         self._tracks: Optional[_pd.DataFrame] = None
         self._matrix: Optional[_pd.DataFrame] = None
         self._optics: Optional[_pd.DataFrame] = None
         self._srloss: Optional[_pd.DataFrame] = None
         self._srloss_steps: Optional[_pd.DataFrame] = None
+        # The data of each run (indexed by its position in the results) is read once, even for partial collections
+        self._tracks_runs: Dict[int, _pd.DataFrame] = dict()
+        self._srloss_runs: Dict[int, _pd.DataFrame] = dict()
+        self._srloss_steps_runs: Dict[int, _pd.DataFrame] = dict()
 
     @classmethod
     def merge(cls, *results: ZgoubiResults):
@@ -85,6 +172,122 @@ class ZgoubiResults:
         """Retrieve results from the list using a numeric index."""
         return self._results[item]
 
+    def _collect(self,
+                 reader: Callable[..., _pd.DataFrame],
+                 parameters: Optional[_MappedParametersListType],
+                 description: str,
+                 cache: Dict[int, _pd.DataFrame],
+                 force_reload: bool = False,
+                 with_units: bool = False,
+                 ) -> Tuple[List[_pd.DataFrame], List[Dict[str, Any]]]:
+        """
+        Reads the data of all the runs matching the given parameters list, together with the columns annotating the
+        data of each run with its parameters (see `_concat`).
+
+        The data of each run is cached, so that it is read only once whatever the parameters lists used to collect it.
+        The cached data must not be modified.
+
+        Args:
+            reader: the function reading the data from the path of a run
+            parameters: the parameters list of the runs to collect (all the runs if None)
+            description: description of the files, used for the warnings when they cannot be read
+            cache: the data already read for each run, indexed by the position of the run in the results
+            force_reload: the data of the collected runs is read again
+            with_units: the parameters are converted to base units (and their names have '.' replaced by '__')
+
+        Returns:
+            a list with the DataFrame of each run for which the data could be read and a list with the annotation
+            columns (names and values) of each of these runs.
+        """
+        def read(path: str) -> Optional[_pd.DataFrame]:
+            try:
+                return reader(path=path)
+            except FileNotFoundError:
+                return None
+
+        selected = [i for i, k in enumerate(self._mappings) if parameters is None or k in parameters]
+        missing = [i for i in selected if force_reload or i not in cache]
+        paths = [self._paths_names[i] for i in missing]
+        if RESULTS_READERS > 1 and len(missing) > 1:  # The files are parsed by pandas, mostly without the GIL
+            with concurrent.futures.ThreadPoolExecutor(max_workers=RESULTS_READERS) as executor:
+                frames = list(executor.map(read, paths))
+        else:
+            frames = [read(p) for p in paths]
+        for i, p, frame in zip(missing, paths, frames):
+            cache.pop(i, None)
+            if frame is None:
+                _logger.warning("Unable to read and load the Zgoubi %s files for path %s.", description, p)
+            else:
+                cache[i] = frame
+
+        data, columns = list(), list()
+        for i in selected:
+            if i in cache:
+                k = self._mappings[i]
+                data.append(cache[i])
+                columns.append(dict())
+                for kk, vv in k.items():
+                    if with_units:
+                        try:
+                            columns[-1][f"{kk.replace('.', '__')}"] = _to_base_units(vv)
+                        except _ureg.UndefinedUnitError:
+                            columns[-1][f"{kk}"] = vv
+                    else:
+                        columns[-1][f"{kk}"] = vv
+        return data, columns
+
+    @staticmethod
+    def _concat(data: List[_pd.DataFrame], columns: List[Dict[str, Any]]) -> _pd.DataFrame:
+        """
+        Concatenates the data of multiple runs and annotates each run with its columns.
+
+        The consecutive runs annotated with the same columns are concatenated together and, when the columns are new
+        and hold plain values, the columns are added once to the concatenated data of these runs; otherwise they are
+        added to the data of each run before the concatenation.
+
+        Args:
+            data: the DataFrame of each run
+            columns: the annotation columns (names and values) of each run
+
+        Returns:
+            the concatenated DataFrame (an empty DataFrame if there is no data).
+        """
+        if len(data) == 0:
+            return _pd.DataFrame()
+        groups = list()
+        start = 0
+        for i in range(1, len(data) + 1):
+            if i == len(data) or columns[i].keys() != columns[start].keys():
+                groups.append(ZgoubiResults._concat_annotated(data[start:i], columns[start:i]))
+                start = i
+        return groups[0] if len(groups) == 1 else _pd.concat(groups, sort=False)
+
+    @staticmethod
+    def _concat_annotated(data: List[_pd.DataFrame], columns: List[Dict[str, Any]]) -> _pd.DataFrame:
+        """
+        Concatenates the data of multiple runs annotated with the same columns (see `_concat`); the data of the runs
+        is not modified.
+
+        Args:
+            data: the DataFrame of each run
+            columns: the annotation columns (names and values) of each run
+
+        Returns:
+            the concatenated DataFrame.
+        """
+        names = list(columns[0].keys())
+        if len(data) > 1 \
+                and not data[0].columns.isin(names).any() \
+                and all(isinstance(v, (str, int, float)) for c in columns for v in c.values()):
+            df = _pd.concat(data, sort=False)
+            if len(names) > 0:
+                lengths = [len(d) for d in data]
+                df[names] = _pd.DataFrame({n: _pd.Series([c[n] for c in columns]).repeat(lengths).to_numpy()
+                                           for n in names},
+                                          index=df.index)
+            return df
+        return _pd.concat([d.assign(**c) for d, c in zip(data, columns)], sort=False)
+
     def get_tracks(self,
                    parameters: Optional[_MappedParametersListType] = None,
                    force_reload: bool = False,
@@ -106,39 +309,20 @@ class ZgoubiResults:
         """
         if self._tracks is not None and parameters is None and force_reload is False:
             return self._tracks
-        tracks = list()
-        particle_id = 0
-        for k, r in self.results:
-            if parameters is None or k in parameters:
-                try:
-                    try:
-                        p = r['path'].name
-                    except AttributeError:
-                        p = r['path']
-                    tracks.append(read_plt_file(path=p))
-                    tracks[-1]['IT'] += particle_id
-                    particle_id = _np.max(tracks[-1]['IT'])
-                    for kk, vv in k.items():
-                        try:
-                            tracks[-1][f"{kk.replace('.', '__')}"] = _ureg.Quantity(vv).to_base_units().m
-                        except _ureg.UndefinedUnitError:
-                            tracks[-1][f"{kk}"] = vv
-                except FileNotFoundError:
-                    _logger.warning(
-                        f"Unable to read and load the Zgoubi .plt files required to collect the tracks for path "
-                        "{r['path']}."
-                    )
-                    continue
-        if len(tracks) > 0:
-            tracks = _pd.concat(tracks, sort=False)
-        else:
-            tracks = _pd.DataFrame()
+        tracks, columns = self._collect(read_plt_file, parameters, '.plt', self._tracks_runs, force_reload,
+                                        with_units=True)
+        # The particles are numbered consecutively across the runs, the offsets are added after the concatenation
+        offsets = _np.cumsum([0] + [t['IT'].to_numpy().max() if len(t) > 0 else _np.nan for t in tracks[:-1]])
+        lengths = [len(t) for t in tracks]
+        tracks = self._concat(tracks, columns)
+        if len(lengths) > 0:
+            tracks['IT'] += _np.repeat(offsets, lengths)
         if parameters is None:
             self._tracks = tracks
         if with_rays:
             zgoubidoo.surveys.construct_rays(tracks=tracks)
         if with_survey:
-            zgoubidoo.surveys.transform_tracks(beamline=self.results[0][1]['input'],
+            zgoubidoo.surveys.transform_tracks(beamline=self._results[0]['input'],
                                                tracks=tracks,
                                                )
         return tracks
@@ -167,26 +351,7 @@ class ZgoubiResults:
         """
         if self._srloss is not None and parameters is None and force_reload is False:
             return self._srloss
-        srloss = list()
-        for k, r in self.results:
-            if parameters is None or k in parameters:
-                try:
-                    try:
-                        p = r['path'].name
-                    except AttributeError:
-                        p = r['path']
-                    srloss.append(read_srloss_file(path=p))
-                    for kk, vv in k.items():
-                        srloss[-1][f"{kk}"] = vv
-                except FileNotFoundError:
-                    _logger.warning(
-                        "Unable to read and load the Zgoubi SRLOSS files required to collect the SRLOSS data."
-                    )
-                    continue
-        if len(srloss) > 0:
-            srloss = _pd.concat(srloss)
-        else:
-            srloss = _pd.DataFrame()
+        srloss = self._concat(*self._collect(read_srloss_file, parameters, 'SRLOSS', self._srloss_runs, force_reload))
         if parameters is None:
             self._srloss = srloss
         return srloss
@@ -218,31 +383,16 @@ class ZgoubiResults:
         """
         if self._srloss_steps is not None and parameters is None and force_reload is False:
             return self._srloss_steps
-        srloss_steps = list()
-        for k, r in self.results:
-            if parameters is None or k in parameters:
-                try:
-                    try:
-                        p = r['path'].name
-                    except AttributeError:
-                        p = r['path']
-                    srloss_steps.append(read_srloss_steps_file(path=p))
-                    for kk, vv in k.items():
-                        srloss_steps[-1][f"{kk}"] = vv
-                except FileNotFoundError:
-                    _logger.warning(
-                        "Unable to read and load the Zgoubi SRLOSS_STEPS files required to collect "
-                        "the SRLOSS STEPS data."
-                    )
-                    continue
-        if len(srloss_steps) > 0:
-            srloss_steps = _pd.concat(srloss_steps)
-        else:
-            srloss_steps = _pd.DataFrame()
+        srloss_steps = self._concat(*self._collect(read_srloss_steps_file,
+                                                   parameters,
+                                                   'SRLOSS_STEPS',
+                                                   self._srloss_steps_runs,
+                                                   force_reload,
+                                                   ))
         if parameters is None:
             self._srloss_steps = srloss_steps
         if with_survey and not srloss_steps.empty:
-            zgoubidoo.surveys.transform_tracks(beamline=self.results[0][1]['input'],
+            zgoubidoo.surveys.transform_tracks(beamline=self._results[0]['input'],
                                                tracks=srloss_steps,
                                                )
         return srloss_steps
@@ -256,6 +406,24 @@ class ZgoubiResults:
         """
         return self.get_srloss_steps()
 
+    def _load(self, reader: Callable[..., _pd.DataFrame], files: str, data: str) -> Optional[_pd.DataFrame]:
+        """
+        Reads and concatenates the data of all the runs.
+
+        Args:
+            reader: the function reading the data from the path of a run
+            files: description of the files, used for the warning when they cannot be read
+            data: description of the data, used for the warning when the files cannot be read
+
+        Returns:
+            the concatenated DataFrame, None if the files of a run cannot be read.
+        """
+        try:
+            return _pd.concat([reader(path=p) for p in self._paths_names])
+        except FileNotFoundError:
+            _logger.warning("Unable to read and load the Zgoubi %s files required to collect the %s data.", files, data)
+            return None
+
     @property
     def matrix(self) -> Optional[_pd.DataFrame]:
         """
@@ -265,20 +433,7 @@ class ZgoubiResults:
             A concatenated DataFrame with all the matrix information from the previous run.
         """
         if self._matrix is None:
-            try:
-                m = list()
-                for r in self._results:
-                    try:
-                        p = r['path'].name
-                    except AttributeError:
-                        p = r['path']
-                    m.append(read_matrix_file(path=p))
-                self._matrix = _pd.concat(m)
-            except FileNotFoundError:
-                _logger.warning(
-                    "Unable to read and load the Zgoubi MATRIX files required to collect the matrix data."
-                )
-                return None
+            self._matrix = self._load(read_matrix_file, 'MATRIX', 'matrix')
         return self._matrix
 
     def get_optics(self,
@@ -292,22 +447,8 @@ class ZgoubiResults:
         Returns:
             A concatenated DataFrame with all the optics information from the previous run.
         """
-        if self._optics is not None and force_reload is False:
-            return self._optics
-        try:
-            m = list()
-            for r in self._results:
-                try:
-                    p = r['path'].name
-                except AttributeError:
-                    p = r['path']
-                m.append(read_optics_file(path=p))
-            self._optics = _pd.concat(m)
-        except FileNotFoundError:
-            _logger.warning(
-                    "Unable to read and load the Zgoubi OPTICS files required to collect the matrix data."
-                )
-            return None
+        if self._optics is None or force_reload is True:
+            self._optics = self._load(read_optics_file, 'OPTICS', 'optics')
         return self._optics
 
     @property
@@ -323,12 +464,15 @@ class ZgoubiResults:
     def results(self) -> List[Tuple[_MappedParametersType, Mapping]]:
         """Raw information from the Zgoubi run.
 
-        Provides the raw data structures from the Zgoubi runs.
+        Provides the raw data structures from the Zgoubi runs. The list is built once and shared by all the calls; it
+        must not be modified.
 
         Returns:
             a list of mappings.
         """
-        return [(r['mapping'], r) for r in self._results]
+        if self._results_pairs is None:
+            self._results_pairs = list(zip(self._mappings, self._results))
+        return self._results_pairs
 
     @property
     def paths(self) -> List[Tuple[_MappedParametersType, Union[str, tempfile.TemporaryDirectory]]]:
@@ -337,7 +481,7 @@ class ZgoubiResults:
         Returns:
             a list of directories.
         """
-        return [(m, r['path']) for m, r in self.results]
+        return list(zip(self._mappings, self._paths))
 
     @property
     def mappings(self) -> List[_MappedParametersType]:
@@ -346,7 +490,7 @@ class ZgoubiResults:
         Returns:
             a list of parametric mappings.
         """
-        return [m for m, r in self.results]
+        return list(self._mappings)
 
     def save(self, destination: str = '.', what: Optional[List[str]] = None):
         """Save files.
@@ -359,7 +503,7 @@ class ZgoubiResults:
             _ZGOUBI_INPUT_FILENAME,
             Zgoubi.RESULT_FILE,
         ]
-        self.results[0][1]['input'].save(destination=destination, what=files)
+        self._results[0]['input'].save(destination=destination, what=files)
 
     def print(self, what: str = 'result'):
         """Helper function to print the raw results from a Zgoubi run."""
@@ -407,13 +551,15 @@ class Zgoubi(Executable):
     def _extract_output(self, path, code_input: _Input, mapping) -> List[str]:
         """Extract element by element output"""
         try:
-            result = open(os.path.join(path, self.RESULT_FILE)).read().split('\n')
+            with open(os.path.join(path, self.RESULT_FILE)) as f:
+                result = f.read().split('\n')
         except FileNotFoundError:
             # TODO add debug mechanism in this case
             raise ZgoubiException(f"Zgoubi execution ended but result '{self.RESULT_FILE}' file not found.")
 
+        outputs = Zgoubi.find_all_labeled_outputs(result, code_input.line)
         for e in code_input.line:
-            e.attach_output(outputs=Zgoubi.find_labeled_output(result, e.LABEL1, e.KEYWORD),
+            e.attach_output(outputs=list(outputs[(e.LABEL1, e.KEYWORD)]),
                             zgoubi_input=code_input,
                             parameters=mapping,
                             )
@@ -432,13 +578,18 @@ class Zgoubi(Executable):
         Returns:
             the output of the given label
         """
-        data: List[str] = []
-        for l in out:
-            if ' ' + label + ' ' in l and 'Keyword' in l and keyword in l:  # This might be a bit fragile
-                data.append(l)
-                continue
-            if len(data) > 0:
-                if '****' in l:  # This might be a bit fragile
-                    break
-                data.append(l)
-        return list(filter(lambda _: len(_), data))
+        return _find_labeled_outputs(out, [(label, keyword)])[(label, keyword)]
+
+    @staticmethod
+    def find_all_labeled_outputs(out: Iterable[str], elements: Iterable[_Command]) -> Dict[Tuple[str, str], List[str]]:
+        """
+        Process the Zgoubi output in a single pass and retrieves output data for multiple labeled elements.
+
+        Args:
+            - out: the Zgoubi output
+            - elements: the elements (commands) to be retrieved
+
+        Returns:
+            the output of each element, indexed by its label and keyword.
+        """
+        return _find_labeled_outputs(out, [(e.LABEL1, e.KEYWORD) for e in elements])